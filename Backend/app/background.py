@@ -1,22 +1,105 @@
 # background.py
 from app.db import contracts_collection
-from app.extractor import process_contract as extract_contract_data
-from datetime import datetime
+from app.worker import run_extraction
+from app.cache import detail_cache
+from app.storage import storage
+from app.scheduler import ExtractionScheduler, ExtractionJob, parse_client_weights
+from app.config import SCHEDULER_CLIENT_WEIGHTS
+from app.models import empty_sections_ready
+from app.templates import find_template, register_fingerprint
+from app.retry import ExtractionFailed, classify_exception, error_type, extraction_retry_policy, call_with_retry
+from app.dead_letters import record_dead_letter, list_dead_letters, remove_dead_letter
+from app.retention import restore_pdf
+from datetime import datetime, timedelta
+from typing import Optional
 import os
 
-def process_contract(contract_id: str, file_path: str):
-    """Background task to process uploaded contract."""
+STRUCTURED_SECTIONS = (
+    "party_identification",
+    "account_information",
+    "financial_details",
+    "payment_structure",
+    "revenue_classification",
+    "service_level_agreements",
+)
+
+def publish_stage(contract_id: str, stage: str, payload: dict):
+    """Persist one extraction stage's output as soon as it is available."""
+    update = {"updated_at": datetime.utcnow(), f"sections_ready.{stage}": True}
+    
+    if stage == "text":
+        text = payload["text"]
+        text_stats = payload.get("text_stats", {})
+        update["raw_extracted_data"] = {
+            "text_length": len(text),
+            "processing_metadata": {
+                "text_preview": text[:500] + "..." if len(text) > 500 else text,
+                "page_count": text_stats.get("page_count", 0),
+                "pages_read": text_stats.get("pages_read", 0),
+                "truncation": payload.get("truncation", [])
+            }
+        }
+        update["section_index"] = payload.get("section_index", {})
+    elif stage == "fields":
+        # Regex sections replace any stale values from a previous run
+        for section in STRUCTURED_SECTIONS:
+            update[section] = payload["fields"].get(section, {})
+    elif stage == "entities":
+        # NER results are merged into the sections the fields stage wrote
+        entities = payload["entities"]
+        if entities.get("persons"):
+            update["party_identification.persons"] = entities["persons"]
+        if entities.get("money"):
+            update["financial_details.money_entities"] = entities["money"]
+        if entities.get("dates"):
+            update["financial_details.dates"] = entities["dates"]
+    
+    contracts_collection.update_one({"contract_id": contract_id, "status": "processing"}, {"$set": update})
+    detail_cache.invalidate(contract_id)
+    print(f"[INFO] Published {stage} stage for contract {contract_id}")
+
+# Failure entries kept on the contract document
+FAILURE_HISTORY_LIMIT = 20
+
+def process_contract(contract_id: str, file_path: str, storage_key: str = None, attempt: int = 1) -> Optional[float]:
+    """Background task to process uploaded contract.
+
+    When `storage_key` is given the file is read through the storage backend,
+    otherwise `file_path` is read directly (contracts uploaded before sharded storage).
+    Returns None when the contract completed or failed for good, or the number of
+    seconds to wait before retrying a transient failure.
+    """
     try:
         # Update status to processing
-        contracts_collection.update_one(
+        call_with_retry(lambda: contracts_collection.update_one(
             {"contract_id": contract_id}, 
-            {"$set": {"status": "processing", "updated_at": datetime.utcnow()}}
-        )
+            {"$set": {
+                "status": "processing",
+                "updated_at": datetime.utcnow(),
+                "attempts": attempt,
+                "sections_ready": empty_sections_ready()
+            }}
+        ), description=f"Marking contract {contract_id} processing")
+        # Reprocessing makes any cached detail response stale
+        detail_cache.invalidate(contract_id)
         
         print(f"[INFO] Started processing contract {contract_id}")
         
-        # Extract comprehensive contract data using the main extractor
-        contract_data = extract_contract_data(file_path)
+        # Extract comprehensive contract data, publishing each stage as it completes
+        def on_stage(stage, payload):
+            publish_stage(contract_id, stage, payload)
+        
+        def template_lookup(signature):
+            return find_template(signature, exclude_contract_id=contract_id)
+        
+        if storage_key:
+            with storage.local_copy(storage_key) as local_path:
+                contract_data = run_extraction(local_path, on_stage=on_stage, template_lookup=template_lookup)
+        else:
+            contract_data = run_extraction(file_path, on_stage=on_stage, template_lookup=template_lookup)
+        
+        if contract_data.get("processing_status") == "failed":
+            raise ExtractionFailed(contract_data.get("error", "Extraction failed"), contract_data.get("error_type"))
         
         # Update the document with extracted data
         update_data = {
@@ -29,36 +112,184 @@ def process_contract(contract_id: str, file_path: str):
             "revenue_classification": contract_data.get("revenue_classification", {}),
             "service_level_agreements": contract_data.get("service_level_agreements", {}),
             "score": contract_data.get("score", 0),
-            # ✅ ADD THESE MISSING FIELDS:
-            "raw_text": contract_data.get("raw_extracted_data", {}).get("full_text"),
+            "truncated": contract_data.get("truncated", False),
+            "truncation_reasons": contract_data.get("truncation_reasons", []),
+            "sections_ready.score": True,
+            "template_match": contract_data.get("template_match"),
+            "error": None,
+            "failure_kind": None,
+            "next_retry_at": None,
+            "section_index": contract_data.get("section_index", {}),
+            "field_locations": contract_data.get("field_locations", {}),
+            # Full text lives in raw_extracted_data.full_text only (raw_text was a duplicate)
             "raw_extracted_data": contract_data.get("raw_extracted_data", {})
         }
         
-        contracts_collection.update_one(
+        call_with_retry(lambda: contracts_collection.update_one(
             {"contract_id": contract_id},
             {"$set": update_data}
-        )
+        ), description=f"Storing results for contract {contract_id}")
+        detail_cache.invalidate(contract_id)
+        
+        # Index the completed contract for template matching; never fail the job over it
+        if contract_data.get("fingerprint"):
+            try:
+                template_id = register_fingerprint(contract_id, contract_data["fingerprint"], contract_data.get("template_match"))
+                print(f"[INFO] Contract {contract_id} indexed under template {template_id}")
+            except Exception as e:
+                print(f"[ERROR] Failed to index fingerprint for contract {contract_id}: {e}")
         
         print(f"[INFO] Successfully processed contract {contract_id} with score: {contract_data.get('score', 0)}")
         print(f"[INFO] Raw data stored - Text length: {len(contract_data.get('raw_extracted_data', {}).get('full_text', ''))}")
         
     except Exception as e:
-        print(f"[ERROR] Failed to process contract {contract_id}: {e}")
+        print(f"[ERROR] Failed to process contract {contract_id} (attempt {attempt}): {e}")
+        partial = contract_data if 'contract_data' in locals() else None
+        return record_failure(contract_id, e, attempt, file_path, storage_key, partial)
+    return None
+
+def record_failure(contract_id: str, exc: Exception, attempt: int, file_path: str = None, storage_key: str = None, partial: dict = None) -> Optional[float]:
+    """Classify a failure, then mark the contract `retrying` or `failed` and dead-letter it.
+
+    Returns the retry delay in seconds, or None when the contract will not be retried.
+    """
+    kind = classify_exception(exc)
+    delay = extraction_retry_policy.next_delay(kind, attempt)
+    now = datetime.utcnow()
+    failure = {"attempt": attempt, "error": str(exc), "error_type": error_type(exc), "kind": kind, "at": now}
+    
+    # ✅ Try to store partial raw data even on failure
+    error_update = {
+        "status": "retrying" if delay is not None else "failed", 
+        "updated_at": now, 
+        "error": str(exc),
+        "failure_kind": kind,
+        "attempts": attempt,
+        "next_retry_at": now + timedelta(seconds=delay) if delay is not None else None
+    }
+    
+    # If we have partial contract_data, store what we can
+    if partial and partial.get("raw_extracted_data"):
+        error_update["raw_extracted_data"] = partial["raw_extracted_data"]
+        print(f"[INFO] Stored partial raw data despite processing failure")
+    
+    try:
+        call_with_retry(lambda: contracts_collection.update_one(
+            {"contract_id": contract_id},
+            {"$set": error_update, "$push": {"failure_history": {"$each": [failure], "$slice": -FAILURE_HISTORY_LIMIT}}}
+        ), description=f"Recording failure of contract {contract_id}")
+        detail_cache.invalidate(contract_id)
         
-        # ✅ Try to store partial raw data even on failure
-        error_update = {
-            "status": "failed", 
-            "updated_at": datetime.utcnow(), 
-            "error": str(e)
-        }
+        if delay is None:
+            doc = contracts_collection.find_one({"contract_id": contract_id}, {"_id": 0, "failure_history": 1})
+            history = (doc or {}).get("failure_history", [failure])
+            record_dead_letter(contract_id, failure, history, file_path, storage_key)
+    except Exception as e:
+        # The database itself is failing. A transient failure is still retried on
+        # schedule; a final one stays unrecorded rather than retried past its policy
+        print(f"[ERROR] Could not record failure of contract {contract_id}: {e}")
+    
+    if delay is not None:
+        print(f"[INFO] Retrying contract {contract_id} ({kind} failure) in {delay:.1f}s")
+    else:
+        print(f"[WARNING] Contract {contract_id} dead-lettered after {attempt} attempt(s): {kind} {failure['error_type']}")
+    return delay
+
+def run_scheduled_job(job):
+    delay = process_contract(job.contract_id, job.file_path, job.storage_key, job.attempt)
+    if delay is not None:
+        extraction_scheduler.submit(job.next_attempt(), delay=delay)
+
+
+extraction_scheduler = ExtractionScheduler(
+    run_scheduled_job,
+    weights=parse_client_weights(SCHEDULER_CLIENT_WEIGHTS)
+)
+
+
+def requeue_dead_letters(query: dict, limit: int, priority: Optional[str] = None) -> dict:
+    """Put dead-lettered contracts back on the extraction queue with a fresh retry budget."""
+    requeued, skipped = [], []
+    for entry in list_dead_letters(query, limit=limit):
+        contract_id = entry["contract_id"]
+        doc = contracts_collection.find_one(
+            {"contract_id": contract_id},
+            {"_id": 0, "status": 1, "file_path": 1, "storage_key": 1, "uploader": 1, "priority": 1, "estimated_cost": 1,
+             "file_sha256": 1, "archive": 1}
+        )
+        if not doc:
+            skipped.append({"contract_id": contract_id, "reason": "contract deleted"})
+            continue
+        if doc.get("status") in ("pending", "processing", "retrying"):
+            skipped.append({"contract_id": contract_id, "reason": f"contract is {doc['status']}"})
+            continue
         
-        # If we have partial contract_data, store what we can
-        if 'contract_data' in locals() and contract_data.get("raw_extracted_data"):
-            error_update["raw_text"] = contract_data["raw_extracted_data"].get("full_text")
-            error_update["raw_extracted_data"] = contract_data["raw_extracted_data"]
-            print(f"[INFO] Stored partial raw data despite processing failure")
+        # Old failures may have had their file moved to the archive tier
+        if doc.get("archive", {}).get("pdf_key"):
+            try:
+                restore_pdf(contract_id, doc)
+            except Exception as e:
+                skipped.append({"contract_id": contract_id, "reason": f"could not restore archived file: {e}"})
+                continue
         
         contracts_collection.update_one(
             {"contract_id": contract_id},
-            {"$set": error_update}
+            {"$set": {
+                "status": "pending",
+                "updated_at": datetime.utcnow(),
+                "attempts": 0,
+                "next_retry_at": None,
+                "sections_ready": empty_sections_ready()
+            }}
         )
+        detail_cache.invalidate(contract_id)
+        remove_dead_letter(contract_id)
+        
+        job_priority = priority or doc.get("priority") or "normal"
+        extraction_scheduler.submit(ExtractionJob(
+            contract_id,
+            doc.get("file_path") or entry.get("file_path"),
+            doc.get("storage_key") or entry.get("storage_key"),
+            doc.get("uploader") or "requeue",
+            job_priority,
+            doc.get("estimated_cost") or 1.0
+        ))
+        requeued.append(contract_id)
+    
+    print(f"[INFO] Requeued {len(requeued)} dead-lettered contracts, skipped {len(skipped)}")
+    return {"requeued": requeued, "skipped": skipped}
+
+
+def resume_unfinished_jobs() -> dict:
+    """Resubmit contracts whose queued or backoff-delayed jobs were lost with the previous process.
+
+    `pending` contracts are queued right away and `retrying` ones once their
+    `next_retry_at` has passed, continuing their attempt count.
+    """
+    now = datetime.utcnow()
+    resumed = {"pending": 0, "retrying": 0}
+    cursor = contracts_collection.find(
+        {"status": {"$in": ["pending", "retrying"]}},
+        {"_id": 0, "contract_id": 1, "status": 1, "file_path": 1, "storage_key": 1, "uploader": 1, "priority": 1,
+         "estimated_cost": 1, "attempts": 1, "next_retry_at": 1}
+    )
+    for doc in cursor:
+        attempt, delay = 1, 0.0
+        if doc["status"] == "retrying":
+            attempt = (doc.get("attempts") or 0) + 1
+            if doc.get("next_retry_at"):
+                delay = max((doc["next_retry_at"] - now).total_seconds(), 0.0)
+        extraction_scheduler.submit(ExtractionJob(
+            doc["contract_id"],
+            doc.get("file_path"),
+            doc.get("storage_key"),
+            doc.get("uploader") or "recovered",
+            doc.get("priority") or "normal",
+            doc.get("estimated_cost") or 1.0,
+            attempt
+        ), delay=delay)
+        resumed[doc["status"]] += 1
+    
+    if resumed["pending"] or resumed["retrying"]:
+        print(f"[INFO] Resumed {resumed['pending']} pending and {resumed['retrying']} retrying contracts")
+    return resumed
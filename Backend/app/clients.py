@@ -0,0 +1,28 @@
+# clients.py
+import hashlib
+from fastapi import Request
+from app.config import API_KEYS
+
+
+def _key_hash(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+# Only hashes are kept, so raw keys never reach memory stats or the database
+_KNOWN_KEYS = {_key_hash(key.strip()) for key in API_KEYS.split(",") if key.strip()}
+
+
+def get_client_id(request: Request) -> str:
+    """Identify the calling client: a configured API key if sent, otherwise the remote address.
+
+    Self-asserted identities (X-Client-Id, unknown keys) are ignored, since a
+    client could rotate them to get fresh rate limits and fair-share credit.
+    Behind a proxy, run uvicorn with --proxy-headers so the address is the caller's.
+    """
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        key_hash = _key_hash(api_key)
+        if key_hash in _KNOWN_KEYS:
+            return "key:" + key_hash
+    host = request.client.host if request.client else "unknown"
+    return "ip:" + host
@@ -0,0 +1,76 @@
+# conditional.py
+"""
+Helpers for HTTP conditional requests (ETag / Last-Modified validators).
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+
+
+def make_etag(*parts, weak: bool = False) -> str:
+    """Build a quoted ETag from the given parts (e.g. contract_id, updated_at, variant)."""
+    raw = ":".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+    tag = f'"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'
+    return f"W/{tag}" if weak else tag
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    """Format a datetime as an HTTP-date. Naive datetimes are treated as UTC (Mongo default)."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the current validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return etag is not None and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since is None:
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: Optional[str], last_modified: Optional[datetime], cache_control: str = "no-cache") -> dict:
+    """Response headers that let clients revalidate instead of refetching."""
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified_response(etag: Optional[str], last_modified: Optional[datetime], cache_control: str = "no-cache") -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified, cache_control))
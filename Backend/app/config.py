@@ -8,3 +8,96 @@ MONGO_URI = os.getenv("MONGO_DB_URL", "mongodb://localhost:27017/")
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads"))
 MAX_FILE_SIZE_MB = 50
 ALLOWED_EXTENSIONS = {".pdf"}
+
+# In-process cache of serialized contract detail responses
+DETAIL_CACHE_MAX_ENTRIES = int(os.getenv("DETAIL_CACHE_MAX_ENTRIES", "1024"))
+DETAIL_CACHE_TTL_SECONDS = int(os.getenv("DETAIL_CACHE_TTL_SECONDS", "300"))
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Bulk export: documents fetched per cursor batch / rows per streamed chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+# File storage backend: "local" (sharded UPLOAD_DIR), "s3", or "s3-local" (S3 API backed by UPLOAD_DIR)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+S3_BUCKET = os.getenv("S3_BUCKET", "contracts")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+DOWNLOAD_CACHE_MAX_AGE = int(os.getenv("DOWNLOAD_CACHE_MAX_AGE", "86400"))
+
+# Extraction worker processes (0 runs extraction in-process, without hard limits)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+# Per-document extraction budgets; 0 disables a limit
+EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", "500"))
+EXTRACTION_MAX_NER_CHARS = int(os.getenv("EXTRACTION_MAX_NER_CHARS", "300000"))
+EXTRACTION_MAX_REGEX_CHARS = int(os.getenv("EXTRACTION_MAX_REGEX_CHARS", "1000000"))
+EXTRACTION_TEXT_SECONDS = float(os.getenv("EXTRACTION_TEXT_SECONDS", "120"))
+EXTRACTION_NER_SECONDS = float(os.getenv("EXTRACTION_NER_SECONDS", "120"))
+EXTRACTION_DOCUMENT_SECONDS = float(os.getenv("EXTRACTION_DOCUMENT_SECONDS", "300"))
+# Worker is killed if a document runs this long past EXTRACTION_DOCUMENT_SECONDS (e.g. stuck in a regex)
+EXTRACTION_HARD_TIMEOUT_GRACE_SECONDS = float(os.getenv("EXTRACTION_HARD_TIMEOUT_GRACE_SECONDS", "30"))
+EXTRACTION_WORKER_MAX_RSS_MB = int(os.getenv("EXTRACTION_WORKER_MAX_RSS_MB", "1536"))
+
+# Extraction scheduling: jobs run concurrently, and per-client limits / fair-share weights
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", str(max(EXTRACTION_WORKERS, 1))))
+# Only enforced while other clients have work queued; leaves them a slot by default
+SCHEDULER_MAX_RUNNING_PER_CLIENT = int(os.getenv("SCHEDULER_MAX_RUNNING_PER_CLIENT", str(max(SCHEDULER_CONCURRENCY - 1, 1))))
+# Estimated cost (in pages) credited to a queued job per second of waiting, so large jobs are not starved
+SCHEDULER_AGING_PAGES_PER_SECOND = float(os.getenv("SCHEDULER_AGING_PAGES_PER_SECOND", "0.5"))
+# e.g. "key:abc123=2,ip:10.0.0.5=0.5"; unlisted clients have weight 1
+SCHEDULER_CLIENT_WEIGHTS = os.getenv("SCHEDULER_CLIENT_WEIGHTS", "")
+
+# Template fingerprinting (MinHash over word shingles, LSH banding for candidate lookup)
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "128"))
+LSH_BANDS = int(os.getenv("LSH_BANDS", "16"))
+SHINGLE_WORDS = int(os.getenv("SHINGLE_WORDS", "5"))
+# Estimated Jaccard similarity needed to treat a contract as generated from a template
+TEMPLATE_MATCH_THRESHOLD = float(os.getenv("TEMPLATE_MATCH_THRESHOLD", "0.8"))
+# Matches below this similarity are flagged as variations of the standard template
+TEMPLATE_VARIATION_THRESHOLD = float(os.getenv("TEMPLATE_VARIATION_THRESHOLD", "0.95"))
+# Characters searched around each template field location on the fast path
+TEMPLATE_WINDOW_MARGIN = int(os.getenv("TEMPLATE_WINDOW_MARGIN", "1500"))
+# Upper bound on LSH candidates compared per lookup
+LSH_MAX_CANDIDATES = int(os.getenv("LSH_MAX_CANDIDATES", "200"))
+
+# Extraction retries: transient failures are retried with exponential backoff and jitter
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "5"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "300"))
+# Attempts for a single status/result write before the whole job is treated as a transient failure
+RETRY_DB_WRITE_ATTEMPTS = int(os.getenv("RETRY_DB_WRITE_ATTEMPTS", "3"))
+
+# Retention: per-status age in days after which extracted text / uploaded PDFs move to the
+# gzip archive tier, e.g. "completed=90,failed=30"; unlisted statuses are never archived
+RETENTION_TEXT_POLICY = os.getenv("RETENTION_TEXT_POLICY", "completed=90,failed=30")
+RETENTION_PDF_POLICY = os.getenv("RETENTION_PDF_POLICY", "completed=30,failed=14")
+# Seconds between background compaction runs; 0 disables the background compactor
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+# Contracts handled per pass per run, and the read+write throughput the compactor may use
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_MAX_BYTES_PER_SECOND = int(os.getenv("RETENTION_MAX_BYTES_PER_SECOND", str(5 * 1024 * 1024)))
+
+# Comma-separated API keys; a request carrying one of them (X-Api-Key) is identified by it,
+# anything else by its remote address
+API_KEYS = os.getenv("API_KEYS", "")
+
+# Rate limiting: token buckets per client and route class (requests per minute, plus burst size)
+RATE_LIMIT_ENABLED = int(os.getenv("RATE_LIMIT_ENABLED", "1"))
+# "memory" (per process) or "mongo" (shared by every API process)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_UPLOAD_PER_MINUTE = float(os.getenv("RATE_LIMIT_UPLOAD_PER_MINUTE", "30"))
+RATE_LIMIT_UPLOAD_BURST = int(os.getenv("RATE_LIMIT_UPLOAD_BURST", "10"))
+RATE_LIMIT_STATUS_PER_MINUTE = float(os.getenv("RATE_LIMIT_STATUS_PER_MINUTE", "120"))
+RATE_LIMIT_STATUS_BURST = int(os.getenv("RATE_LIMIT_STATUS_BURST", "20"))
+RATE_LIMIT_DOWNLOAD_PER_MINUTE = float(os.getenv("RATE_LIMIT_DOWNLOAD_PER_MINUTE", "60"))
+RATE_LIMIT_DOWNLOAD_BURST = int(os.getenv("RATE_LIMIT_DOWNLOAD_BURST", "20"))
+RATE_LIMIT_DEFAULT_PER_MINUTE = float(os.getenv("RATE_LIMIT_DEFAULT_PER_MINUTE", "300"))
+RATE_LIMIT_DEFAULT_BURST = int(os.getenv("RATE_LIMIT_DEFAULT_BURST", "60"))
+# Buckets kept by the in-process store (least recently used are dropped first)
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+# Admission control for uploads: in-flight requests and request bytes, overall and per client
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "8"))
+UPLOAD_MAX_CONCURRENT_PER_CLIENT = int(os.getenv("UPLOAD_MAX_CONCURRENT_PER_CLIENT", "2"))
+UPLOAD_MAX_INFLIGHT_MB = int(os.getenv("UPLOAD_MAX_INFLIGHT_MB", "200"))
@@ -5,3 +5,6 @@ from app.config import MONGO_URI
 client = MongoClient(MONGO_URI)
 db = client["contractParser"]
 contracts_collection = db["contracts"]
+fingerprints_collection = db["contract_fingerprints"]
+dead_letters_collection = db["contract_dead_letters"]
+rate_limits_collection = db["rate_limits"]
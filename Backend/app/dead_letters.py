@@ -0,0 +1,80 @@
+# dead_letters.py
+"""
+Dead-letter collection for contracts whose extraction failed for good.
+
+A contract lands here after a permanent failure or once its transient failures
+exhaust the retry policy. Entries keep the failure classification and attempt
+history so failures can be triaged in bulk and requeued once the cause is fixed.
+"""
+from datetime import datetime
+from typing import Optional
+from app.db import dead_letters_collection
+from app.retry import call_with_retry
+
+
+def ensure_indexes():
+    dead_letters_collection.create_index("contract_id", unique=True)
+    dead_letters_collection.create_index([("failure_kind", 1), ("error_type", 1)])
+    dead_letters_collection.create_index("dead_lettered_at")
+
+
+def build_dead_letter_query(
+    failure_kind: Optional[str] = None,
+    error_type: Optional[str] = None,
+    contract_ids: Optional[list] = None,
+) -> dict:
+    query = {}
+    if failure_kind:
+        query["failure_kind"] = failure_kind
+    if error_type:
+        query["error_type"] = error_type
+    if contract_ids:
+        query["contract_id"] = {"$in": contract_ids}
+    return query
+
+
+def record_dead_letter(contract_id: str, failure: dict, history: list, file_path: str = None, storage_key: str = None):
+    """Store (or replace) the dead letter for a contract."""
+    entry = {
+        "contract_id": contract_id,
+        "error": failure["error"],
+        "error_type": failure["error_type"],
+        "failure_kind": failure["kind"],
+        "attempts": failure["attempt"],
+        "history": history,
+        "file_path": file_path,
+        "storage_key": storage_key,
+        "dead_lettered_at": datetime.utcnow()
+    }
+    call_with_retry(
+        lambda: dead_letters_collection.replace_one({"contract_id": contract_id}, entry, upsert=True),
+        description=f"Dead-lettering contract {contract_id}"
+    )
+
+
+def list_dead_letters(query: dict, skip: int = 0, limit: int = 50) -> list:
+    cursor = dead_letters_collection.find(query, {"_id": 0}).sort("dead_lettered_at", -1).skip(skip).limit(limit)
+    return list(cursor)
+
+
+def summarize_dead_letters(query: dict) -> dict:
+    """Dead-letter counts grouped by failure kind and error type."""
+    summary = {"total": 0, "by_kind": {}, "by_error_type": {}}
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": {"kind": "$failure_kind", "error_type": "$error_type"}, "count": {"$sum": 1}}}
+    ]
+    for group in dead_letters_collection.aggregate(pipeline):
+        kind, group_error_type = group["_id"].get("kind"), group["_id"].get("error_type")
+        summary["total"] += group["count"]
+        summary["by_kind"][kind] = summary["by_kind"].get(kind, 0) + group["count"]
+        summary["by_error_type"][group_error_type] = summary["by_error_type"].get(group_error_type, 0) + group["count"]
+    return summary
+
+
+def get_dead_letter(contract_id: str) -> Optional[dict]:
+    return dead_letters_collection.find_one({"contract_id": contract_id}, {"_id": 0})
+
+
+def remove_dead_letter(contract_id: str):
+    dead_letters_collection.delete_one({"contract_id": contract_id})
@@ -0,0 +1,118 @@
+# downloads.py
+"""
+Byte-range aware file responses for contract downloads.
+"""
+from typing import Optional, Tuple
+import anyio
+from starlette.concurrency import iterate_in_threadpool
+from starlette.responses import Response
+from app.storage import StorageBackend
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a Range header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be served (no header, an unsupported
+    unit, or multiple ranges, which servers may ignore). Raises RangeNotSatisfiable
+    when the range lies entirely outside the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    """Serves a byte range of a stored file.
+
+    Local files are sent with the ASGI zero-copy (sendfile) extension when the
+    server supports it, and read in chunks otherwise. Remote backends are streamed
+    through the storage backend's ranged reads.
+    """
+    
+    def __init__(
+        self,
+        backend: StorageBackend,
+        key: str,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: str = "application/pdf",
+    ):
+        self.backend = backend
+        self.key = key
+        self.start = start
+        self.count = max(end - start + 1, 0)
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        headers = dict(headers or {})
+        headers["Content-Length"] = str(self.count)
+        self.init_headers(headers)
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        
+        if scope.get("method") == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        
+        path = self.backend.local_path(self.key)
+        if path is not None and "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+        
+        if path is not None:
+            async with await anyio.open_file(path, "rb") as f:
+                await f.seek(self.start)
+                remaining = self.count
+                while remaining > 0:
+                    chunk = await f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        
+        chunks = self.backend.iter_range(self.key, self.start, self.start + self.count - 1, CHUNK_SIZE)
+        async for chunk in iterate_in_threadpool(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
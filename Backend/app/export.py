@@ -0,0 +1,254 @@
+# export.py
+"""
+Streaming bulk export of extraction results as CSV, JSONL or Parquet.
+
+Rows are read from a MongoDB cursor in batches and written out incrementally,
+so memory use stays constant regardless of how many contracts are exported.
+
+CLI usage:
+    python -m app.export --format parquet --output contracts.parquet --status completed
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+from app.config import EXPORT_BATCH_SIZE
+from app.responses import dumps
+
+EXPORT_FORMATS = {"csv", "jsonl", "parquet"}
+
+# (column name, document path, type) - lists are flattened to "; "-joined strings in CSV
+EXPORT_COLUMNS = [
+    ("contract_id", "contract_id", "str"),
+    ("original_filename", "original_filename", "str"),
+    ("status", "status", "str"),
+    ("score", "score", "int"),
+    ("truncated", "truncated", "bool"),
+    ("created_at", "created_at", "datetime"),
+    ("updated_at", "updated_at", "datetime"),
+    ("party_parties", "party_identification.parties", "list"),
+    ("party_persons", "party_identification.persons", "list"),
+    ("party_registration_details", "party_identification.registration_details", "list"),
+    ("party_signatories", "party_identification.signatories", "list"),
+    ("account_emails", "account_information.emails", "list"),
+    ("account_numbers", "account_information.account_numbers", "list"),
+    ("financial_amounts", "financial_details.amounts", "list"),
+    ("financial_money_entities", "financial_details.money_entities", "list"),
+    ("financial_line_items", "financial_details.line_items", "list"),
+    ("financial_dates", "financial_details.dates", "list"),
+    ("payment_terms", "payment_structure.terms", "list"),
+    ("payment_schedules", "payment_structure.schedules", "list"),
+    ("revenue_recurring", "revenue_classification.recurring", "bool"),
+    ("revenue_indicators", "revenue_classification.indicators", "list"),
+    ("revenue_billing_cycles", "revenue_classification.billing_cycles", "list"),
+    ("sla_terms", "service_level_agreements.sla_terms", "list"),
+]
+_COLUMNS_BY_NAME = {name: (path, col_type) for name, path, col_type in EXPORT_COLUMNS}
+
+
+class ExportError(ValueError):
+    """Raised for invalid export requests (unknown format or columns, missing dependency)."""
+
+
+def parse_columns(columns: Optional[str]) -> List[str]:
+    """Parse a comma-separated column selection; all columns when empty."""
+    if not columns:
+        return [name for name, _, _ in EXPORT_COLUMNS]
+    
+    selected = []
+    for raw in columns.split(","):
+        name = raw.strip()
+        if not name:
+            continue
+        if name not in _COLUMNS_BY_NAME:
+            raise ExportError(f"Unknown export column: {name}")
+        if name not in selected:
+            selected.append(name)
+    if not selected:
+        raise ExportError("No export columns selected")
+    return selected
+
+
+def build_export_projection(columns: List[str]) -> dict:
+    """MongoDB projection covering only the selected columns."""
+    projection = {"_id": 0}
+    for name in columns:
+        projection[_COLUMNS_BY_NAME[name][0]] = 1
+    return projection
+
+
+def _lookup(doc: dict, path: str):
+    value = doc
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def flatten_contract(doc: dict, columns: List[str]) -> dict:
+    """Flatten a contract document into a single row keyed by export column name."""
+    row = {}
+    for name in columns:
+        path, col_type = _COLUMNS_BY_NAME[name]
+        value = _lookup(doc, path)
+        if col_type == "list":
+            if value is None:
+                value = []
+            elif not isinstance(value, list):
+                value = [value]
+            value = [str(v) for v in value]
+        row[name] = value
+    return row
+
+
+def iter_contract_rows(collection, filter_query: dict, columns: List[str], sort_query=None) -> Iterator[dict]:
+    """Yield flattened rows straight from a MongoDB cursor."""
+    cursor = collection.find(filter_query, build_export_projection(columns), batch_size=EXPORT_BATCH_SIZE)
+    if sort_query:
+        cursor = cursor.sort(sort_query)
+    try:
+        for doc in cursor:
+            yield flatten_contract(doc, columns)
+    finally:
+        cursor.close()
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return "; ".join(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None:
+        return ""
+    return value
+
+
+def stream_csv(rows: Iterable[dict], columns: List[str], chunk_rows: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Encode rows as CSV, yielding one chunk per `chunk_rows` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_csv_value(row[name]) for name in columns])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def stream_jsonl(rows: Iterable[dict], chunk_rows: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Encode rows as newline-delimited JSON, yielding one chunk per `chunk_rows` rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row))
+        if len(chunk) >= chunk_rows:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def write_parquet(rows: Iterable[dict], columns: List[str], output_path: str, row_group_rows: int = EXPORT_BATCH_SIZE) -> int:
+    """Write rows to a Parquet file one row group at a time. Requires pyarrow.
+
+    Returns the number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export requires the 'pyarrow' package")
+    
+    arrow_types = {
+        "str": pa.string(),
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "datetime": pa.timestamp("ms"),
+        "list": pa.list_(pa.string()),
+    }
+    schema = pa.schema([(name, arrow_types[_COLUMNS_BY_NAME[name][1]]) for name in columns])
+    
+    total = 0
+    with pq.ParquetWriter(output_path, schema, compression="zstd") as writer:
+        batch = {name: [] for name in columns}
+        pending = 0
+        for row in rows:
+            for name in columns:
+                batch[name].append(row[name])
+            pending += 1
+            if pending >= row_group_rows:
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+                total += pending
+                batch = {name: [] for name in columns}
+                pending = 0
+        if pending or total == 0:
+            writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+            total += pending
+    return total
+
+
+def export_contracts(collection, fmt: str, output, filter_query: dict, columns: List[str], sort_query=None) -> int:
+    """Export matching contracts to `output` (a path for parquet, a binary file object otherwise)."""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format: {fmt}")
+    
+    rows = iter_contract_rows(collection, filter_query, columns, sort_query)
+    if fmt == "parquet":
+        return write_parquet(rows, columns, output)
+    
+    count = 0
+    
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+    
+    chunks = stream_csv(counted(), columns) if fmt == "csv" else stream_jsonl(counted())
+    for chunk in chunks:
+        output.write(chunk)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from app.db import contracts_collection
+    from app.queries import build_filter_query
+    
+    parser = argparse.ArgumentParser(description="Export extracted contract data.")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", "-o", help="Output file (defaults to stdout for csv/jsonl)")
+    parser.add_argument("--status", help="Filter by status: pending, processing, completed, failed")
+    parser.add_argument("--min-score", type=int)
+    parser.add_argument("--max-score", type=int)
+    parser.add_argument("--search", help="Search in filename")
+    parser.add_argument("--columns", help="Comma-separated export columns (default: all)")
+    parser.add_argument("--sort-by", default="created_at")
+    parser.add_argument("--sort-order", choices=["asc", "desc"], default="asc")
+    args = parser.parse_args()
+    
+    try:
+        selected = parse_columns(args.columns)
+        filter_query = build_filter_query(args.status, args.min_score, args.max_score, args.search)
+        sort_query = [(args.sort_by, 1 if args.sort_order == "asc" else -1)]
+        
+        if args.format == "parquet":
+            if not args.output:
+                parser.error("--output is required for parquet export")
+            written = export_contracts(contracts_collection, "parquet", args.output, filter_query, selected, sort_query)
+        elif args.output:
+            with open(args.output, "wb") as f:
+                written = export_contracts(contracts_collection, args.format, f, filter_query, selected, sort_query)
+        else:
+            written = export_contracts(contracts_collection, args.format, sys.stdout.buffer, filter_query, selected, sort_query)
+    except ExportError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    print(f"[INFO] Exported {written} contracts", file=sys.stderr)
@@ -2,10 +2,12 @@
 import pdfplumber
 import spacy
 import re
+import time
 from pymongo import MongoClient
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
+from app.segmentation import segment_text, build_routes, page_for_offset
 
 # Load environment variables
 load_dotenv()
@@ -27,28 +29,141 @@ ACCOUNT_REGEX = r"Account\s*Number[:\s]*([\w-]+)"
 DATE_REGEX = r"\b(?:\d{1,2}[/-])?\d{1,2}[/-]\d{2,4}\b"
 MONEY_REGEX = r"\$\s?\d+[\d,]*(?:\.\d{2})?"
 
+# Size of the text chunks fed to spaCy when NER runs under a time budget
+NER_CHUNK_CHARS = 20000
+
 # Helper: extract text from PDF
 def extract_text(pdf_path):
     """Extract all text from a PDF file."""
+    return extract_text_with_stats(pdf_path)[0]
+
+def extract_text_with_stats(pdf_path, max_pages=None, deadline=None):
+    """Extract text from a PDF, stopping after `max_pages` pages or once `deadline` (time.monotonic()) passes.
+
+    Returns (text, stats) where stats holds page_count, pages_read, the start offset of
+    each page read (page_offsets) and the truncation reason, if any.
+    """
+    stats = {"page_count": 0, "pages_read": 0, "page_offsets": [], "truncated": None}
+    pages = []
+    offset = 0
     try:
         with pdfplumber.open(pdf_path) as pdf:
-            return "\n".join(page.extract_text() or "" for page in pdf.pages)
+            stats["page_count"] = len(pdf.pages)
+            for page in pdf.pages:
+                if max_pages is not None and stats["pages_read"] >= max_pages:
+                    stats["truncated"] = "page_limit"
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    stats["truncated"] = "text_timeout"
+                    break
+                page_text = page.extract_text() or ""
+                pages.append(page_text)
+                stats["page_offsets"].append(offset)
+                offset += len(page_text) + 1  # pages are joined with "\n"
+                stats["pages_read"] += 1
+                # Release cached layout objects; large documents otherwise hold every page in memory
+                page.flush_cache()
     except Exception as e:
         print(f"[ERROR] PDF extraction failed: {e}")
-        return ""
+    return "\n".join(pages), stats
 
 # Helper: extract NER entities
 def extract_entities(text):
     """Extract PERSON, DATE, MONEY using spaCy NER."""
-    doc = nlp(text)
-    people = list(set(ent.text for ent in doc.ents if ent.label_ == "PERSON"))
-    dates = list(set(ent.text for ent in doc.ents if ent.label_ == "DATE"))
-    money = list(set(ent.text for ent in doc.ents if ent.label_ == "MONEY"))
-    return {"persons": people, "dates": dates, "money": money}
+    return extract_entities_with_stats(text)[0]
+
+def _text_chunks(text, size):
+    """Split text into chunks of roughly `size` characters, breaking at newlines where possible."""
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        yield text[start:end]
+        start = end
+
+def extract_entities_with_stats(text, deadline=None, spans=None):
+    """Extract PERSON, DATE, MONEY using spaCy NER, stopping between chunks once `deadline` passes.
+
+    Returns (entities, truncated). `spans`, when given, is filled with
+    {"ner:<LABEL>": [(text, start, end), ...]}.
+    """
+    people, dates, money = set(), set(), set()
+    chunks = [text] if deadline is None and len(text) <= NER_CHUNK_CHARS else _text_chunks(text, NER_CHUNK_CHARS)
+    truncated = False
+    chunk_start = 0
+    for chunk in chunks:
+        if deadline is not None and time.monotonic() > deadline:
+            truncated = True
+            break
+        doc = nlp(chunk)
+        if spans is not None:
+            for ent in doc.ents:
+                if ent.label_ in ("PERSON", "DATE", "MONEY"):
+                    spans.setdefault(f"ner:{ent.label_}", []).append(
+                        (ent.text, chunk_start + ent.start_char, chunk_start + ent.end_char)
+                    )
+        chunk_start += len(chunk)
+        people.update(ent.text for ent in doc.ents if ent.label_ == "PERSON")
+        dates.update(ent.text for ent in doc.ents if ent.label_ == "DATE")
+        money.update(ent.text for ent in doc.ents if ent.label_ == "MONEY")
+    return {"persons": list(people), "dates": list(dates), "money": list(money)}, truncated
+
+# Maximum match spans recorded per pattern
+MAX_LOCATIONS_PER_PATTERN = 20
+
+def _match_value(match):
+    """Value of a match, shaped like re.findall's output."""
+    groups = match.groups("")
+    if not groups:
+        return match.group(0)
+    if len(groups) == 1:
+        return groups[0]
+    return groups
 
 # Helper: regex/keyword extraction
-def extract_fields(text):
-    """Extract contract fields using regex and keyword search."""
+def extract_fields(text, plan=None, locations=None, routes=None, spans=None):
+    """Extract contract fields using regex and keyword search.
+
+    Every pattern has an id of the form "<rule>:<index>". `plan`, when given (see
+    app.fingerprint.build_plan), maps pattern ids to [start, end] windows around where a
+    matching template had its matches, and those patterns search only there. Patterns the
+    template never matched use `routes` (see app.segmentation.build_routes), which maps
+    rules to the windows of their relevant sections, so content added to a template is
+    still found. Either way, a pattern that finds nothing in its windows falls back to
+    the full text.
+    `locations`, when given, is filled with {pattern_id: [[start, end], ...]} for every match,
+    and `spans` with {rule: [(value, start, end), ...]} for every captured value.
+    """
+    def find(pattern_id, pattern, flags=0):
+        rule = pattern_id.split(":", 1)[0]
+        windows = None
+        if plan is not None and pattern_id in plan:
+            windows = plan[pattern_id]
+        elif routes is not None:
+            windows = routes.get(rule)
+        
+        matches = []
+        if windows:
+            compiled = re.compile(pattern, flags)
+            for start, end in windows:
+                matches.extend(compiled.finditer(text, start, end))
+        if not matches:
+            matches = list(re.finditer(pattern, text, flags))
+        
+        if locations is not None and matches:
+            locations[pattern_id] = [[m.start(), m.end()] for m in matches[:MAX_LOCATIONS_PER_PATTERN]]
+        if spans is not None:
+            rule_spans = spans.setdefault(rule, [])
+            for m in matches:
+                if m.re.groups:
+                    rule_spans.extend((m.group(g), m.start(g), m.end(g)) for g in range(1, m.re.groups + 1) if m.group(g) is not None)
+                else:
+                    rule_spans.append((m.group(0), m.start(), m.end()))
+        return [_match_value(m) for m in matches]
+    
     fields = {
         "party_identification": {},
         "account_information": {},
@@ -65,8 +180,8 @@ def extract_fields(text):
         r"Customer:\s*(.*?)(?:\n|Vendor)",
         r"Client:\s*(.*?)(?:\n|Provider)"
     ]
-    for pattern in parties_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
+    for i, pattern in enumerate(parties_patterns):
+        matches = find(f"parties:{i}", pattern, re.IGNORECASE | re.DOTALL)
         if matches:
             if isinstance(matches[0], tuple):
                 fields["party_identification"]["parties"] = list(matches[0])
@@ -81,8 +196,8 @@ def extract_fields(text):
         r"Company\s*(?:No\.?|Number)[:\s]*([\w-]+)"
     ]
     reg_details = []
-    for pattern in reg_patterns:
-        reg_details.extend(re.findall(pattern, text, re.IGNORECASE))
+    for i, pattern in enumerate(reg_patterns):
+        reg_details.extend(find(f"registration:{i}", pattern, re.IGNORECASE))
     if reg_details:
         fields["party_identification"]["registration_details"] = reg_details
     
@@ -93,13 +208,13 @@ def extract_fields(text):
         r"(?:CEO|President|Director|Manager)[:\s]+(.*?)(?:\n|,)"
     ]
     signatories = []
-    for pattern in sig_patterns:
-        signatories.extend(re.findall(pattern, text, re.IGNORECASE))
+    for i, pattern in enumerate(sig_patterns):
+        signatories.extend(find(f"signatories:{i}", pattern, re.IGNORECASE))
     if signatories:
         fields["party_identification"]["signatories"] = signatories[:5]  # Limit to 5
     
     # Account Information - Enhanced
-    emails = re.findall(EMAIL_REGEX, text)
+    emails = find("emails:0", EMAIL_REGEX)
     if emails:
         fields["account_information"]["emails"] = list(set(emails))[:10]  # Unique emails, max 10
     
@@ -110,8 +225,8 @@ def extract_fields(text):
         r"Reference\s*(?:No\.?|Number)[:\s]*([\w-]+)"
     ]
     accounts = []
-    for pattern in account_patterns:
-        accounts.extend(re.findall(pattern, text, re.IGNORECASE))
+    for i, pattern in enumerate(account_patterns):
+        accounts.extend(find(f"account_numbers:{i}", pattern, re.IGNORECASE))
     if accounts:
         fields["account_information"]["account_numbers"] = list(set(accounts))
     
@@ -122,8 +237,8 @@ def extract_fields(text):
         r"\d+[\d,]*(?:\.\d{2})?\s?(?:dollars?|USD|\$)",
     ]
     amounts = []
-    for pattern in money_patterns:
-        amounts.extend(re.findall(pattern, text, re.IGNORECASE))
+    for i, pattern in enumerate(money_patterns):
+        amounts.extend(find(f"amounts:{i}", pattern, re.IGNORECASE))
     if amounts:
         fields["financial_details"]["amounts"] = list(set(amounts))[:20]  # Max 20 amounts
     
@@ -133,13 +248,13 @@ def extract_fields(text):
         r"Description[:\s]+(.*?)(?:\n|Quantity|Price)"
     ]
     line_items = []
-    for pattern in line_item_patterns:
-        line_items.extend(re.findall(pattern, text, re.IGNORECASE | re.DOTALL))
+    for i, pattern in enumerate(line_item_patterns):
+        line_items.extend(find(f"line_items:{i}", pattern, re.IGNORECASE | re.DOTALL))
     if line_items:
         fields["financial_details"]["line_items"] = [item.strip()[:100] for item in line_items[:10]]
     
     # Payment Structure - Enhanced
-    payment_terms = re.findall(r"Net\s*\d+", text, re.IGNORECASE)
+    payment_terms = find("payment_terms:0", r"Net\s*\d+", re.IGNORECASE)
     if payment_terms:
         fields["payment_structure"]["terms"] = list(set(payment_terms))
     
@@ -150,15 +265,16 @@ def extract_fields(text):
         r"(?:monthly|quarterly|annually|yearly)",
     ]
     schedules = []
-    for pattern in schedule_patterns:
-        schedules.extend(re.findall(pattern, text, re.IGNORECASE))
+    for i, pattern in enumerate(schedule_patterns):
+        schedules.extend(find(f"schedules:{i}", pattern, re.IGNORECASE))
     if schedules:
         fields["payment_structure"]["schedules"] = [s.strip() for s in schedules[:5]]
     
     # Revenue Classification - Enhanced
-    recurring_indicators = re.findall(
+    recurring_indicators = find(
+        "recurring:0",
         r"recurring|subscription|monthly|quarterly|annual|yearly|renewal|auto-renew", 
-        text, re.IGNORECASE
+        re.IGNORECASE
     )
     if recurring_indicators:
         fields["revenue_classification"]["recurring"] = True
@@ -172,8 +288,8 @@ def extract_fields(text):
         r"(?:every|each)\s+(?:month|quarter|year)",
     ]
     cycles = []
-    for pattern in cycle_patterns:
-        cycles.extend(re.findall(pattern, text, re.IGNORECASE))
+    for i, pattern in enumerate(cycle_patterns):
+        cycles.extend(find(f"billing_cycles:{i}", pattern, re.IGNORECASE))
     if cycles:
         fields["revenue_classification"]["billing_cycles"] = list(set(cycles))
     
@@ -188,13 +304,58 @@ def extract_fields(text):
         r"response time[:\s]+(.*?)(?:\n|\.)"
     ]
     sla_terms = []
-    for pattern in sla_patterns:
-        sla_terms.extend(re.findall(pattern, text, re.IGNORECASE))
+    for i, pattern in enumerate(sla_patterns):
+        sla_terms.extend(find(f"sla:{i}", pattern, re.IGNORECASE))
     if sla_terms:
         fields["service_level_agreements"]["sla_terms"] = list(set(sla_terms))[:10]
     
     return fields
 
+# Which rule (or NER label) produced each list-valued field
+FIELD_SOURCES = {
+    ("party_identification", "parties"): "parties",
+    ("party_identification", "registration_details"): "registration",
+    ("party_identification", "signatories"): "signatories",
+    ("party_identification", "persons"): "ner:PERSON",
+    ("account_information", "emails"): "emails",
+    ("account_information", "account_numbers"): "account_numbers",
+    ("financial_details", "amounts"): "amounts",
+    ("financial_details", "line_items"): "line_items",
+    ("financial_details", "money_entities"): "ner:MONEY",
+    ("financial_details", "dates"): "ner:DATE",
+    ("payment_structure", "terms"): "payment_terms",
+    ("payment_structure", "schedules"): "schedules",
+    ("revenue_classification", "indicators"): "recurring",
+    ("revenue_classification", "billing_cycles"): "billing_cycles",
+    ("service_level_agreements", "sla_terms"): "sla",
+}
+
+def _location_key(value):
+    return str(value).strip()[:100]
+
+def locate_values(fields, spans, page_offsets):
+    """Record where each extracted value came from.
+
+    Returns {section: {field: [{"value", "start", "end", "page"}, ...]}} using the first
+    occurrence of each value; values that cannot be traced to a span are omitted.
+    """
+    field_locations = {}
+    for (section, key), source in FIELD_SOURCES.items():
+        values = fields.get(section, {}).get(key)
+        if not values:
+            continue
+        first_seen = {}
+        for value, start, end in spans.get(source, []):
+            first_seen.setdefault(_location_key(value), (start, end))
+        located = []
+        for value in values:
+            span = first_seen.get(_location_key(value))
+            if span:
+                located.append({"value": value, "start": span[0], "end": span[1], "page": page_for_offset(page_offsets, span[0])})
+        if located:
+            field_locations.setdefault(section, {})[key] = located
+    return field_locations
+
 # Helper: scoring - Enhanced
 def score_fields(fields):
     """Weighted scoring based on completeness (0-100 points)."""
@@ -260,62 +421,160 @@ def create_raw_data_summary(text, entities, fields):
     
     return raw_data
 
-# Main processing function - UPDATED
-def process_contract(pdf_path):
-    """Extract, analyze, score, and store contract info from PDF."""
-    result = {
+def empty_fields():
+    """Empty structured sections, used when extraction stops before the regex stage."""
+    return {
         "party_identification": {},
         "account_information": {},
         "financial_details": {},
         "payment_structure": {},
         "revenue_classification": {},
         "service_level_agreements": {},
+    }
+
+def new_result(pdf_path):
+    """Initial result dict returned by process_contract."""
+    result = empty_fields()
+    result.update({
         "raw_extracted_data": {},  # ✅ NEW: Field for raw data
         "score": 0,
         "created_at": datetime.now(timezone.utc),
         "file_path": pdf_path,
-        "processing_status": "processing"
-    }
+        "processing_status": "processing",
+        "truncated": False,
+        "truncation_reasons": [],
+        "fingerprint": None,
+        "template_match": None,
+        "section_index": {},
+        "field_locations": {}
+    })
+    return result
+
+def finalize_result(result, text, entities, fields, truncation=None, text_stats=None):
+    """Merge stage outputs into `result`, score it and mark it completed.
+
+    Also used to assemble partial results when a budget cut extraction short,
+    in which case `entities` and/or `fields` may be None.
+    """
+    truncation = list(truncation or [])
+    entities = entities or {"persons": [], "dates": [], "money": []}
+    fields = fields or empty_fields()
+    
+    # ✅ NEW: Create comprehensive raw data
+    raw_data = create_raw_data_summary(text, entities, fields)
+    raw_data["processing_metadata"]["truncation"] = truncation
+    if text_stats:
+        raw_data["processing_metadata"]["page_count"] = text_stats.get("page_count", 0)
+        raw_data["processing_metadata"]["pages_read"] = text_stats.get("pages_read", 0)
+    result["raw_extracted_data"] = raw_data
+    
+    # Merge NER results into structured fields
+    if entities["persons"]:
+        fields["party_identification"]["persons"] = entities["persons"]
+    if entities["money"]:
+        fields["financial_details"]["money_entities"] = entities["money"]
+    if entities["dates"]:
+        fields["financial_details"]["dates"] = entities["dates"]
+    
+    # Update result with extracted data
+    result.update(fields)
+    
+    # Calculate weighted score
+    result["score"] = score_fields(fields)
+    result["processing_status"] = "completed"
+    result["truncated"] = bool(truncation)
+    result["truncation_reasons"] = truncation
+    return result
+
+# Main processing function - UPDATED
+def process_contract(pdf_path, budget=None, on_stage=None, template_lookup=None):
+    """Extract, analyze, score, and store contract info from PDF.
+
+    `budget` optionally limits the work done per document: max_pages, max_ner_chars,
+    max_regex_chars and the wall-time limits text_seconds, ner_seconds and
+    document_seconds. Exceeding a limit truncates the input of the remaining
+    stages and sets result["truncated"] instead of failing.
+    `on_stage(stage, payload)` is called as the text, fields and entities stages finish,
+    so callers can publish partial results before the slow NER stage completes.
+    `template_lookup(signature)`, when given, returns the nearest known template for the
+    document's MinHash signature (see app.templates); a match lets the regex stage search
+    only around the template's field locations.
+    """
+    result = new_result(pdf_path)
+    budget = budget or {}
+    started = time.monotonic()
+    truncation = []
+    
+    def stage_deadline(stage_key):
+        limits = [started + budget[k] for k in (stage_key, "document_seconds") if budget.get(k)]
+        return min(limits) if limits else None
+    
+    def publish(stage, payload):
+        if on_stage is not None:
+            on_stage(stage, payload)
     
     try:
         print(f"[INFO] Starting contract extraction for: {pdf_path}")
         
         # Extract text from PDF
-        text = extract_text(pdf_path)
+        text, text_stats = extract_text_with_stats(pdf_path, budget.get("max_pages"), stage_deadline("text_seconds"))
+        if text_stats["truncated"]:
+            truncation.append(text_stats["truncated"])
         if not text or len(text.strip()) < 50:
             raise Exception("Insufficient text extracted from PDF.")
         
-        print(f"[INFO] Extracted {len(text)} characters of text")
-        
-        # Extract entities using spaCy NER
-        entities = extract_entities(text)
-        print(f"[INFO] Found {len(entities['persons'])} persons, {len(entities['money'])} money entities")
+        print(f"[INFO] Extracted {len(text)} characters of text from {text_stats['pages_read']}/{text_stats['page_count']} pages")
         
-        # Extract structured fields
-        fields = extract_fields(text)
+        # Segment into pages and sections so rules only scan the sections relevant to them
+        section_index = segment_text(text, text_stats["page_offsets"])
+        result["section_index"] = section_index
+        publish("text", {"text": text, "text_stats": text_stats, "section_index": section_index, "truncation": list(truncation)})
         
-        # ✅ NEW: Create comprehensive raw data
-        raw_data = create_raw_data_summary(text, entities, fields)
-        result["raw_extracted_data"] = raw_data
+        # Extract structured fields (cheap, so published before the slower NER stage)
+        regex_text = text
+        max_regex_chars = budget.get("max_regex_chars")
+        if max_regex_chars and len(text) > max_regex_chars:
+            regex_text = text[:max_regex_chars]
+            truncation.append("regex_char_limit")
         
-        print(f"[INFO] Raw data stored - Text length: {len(text)}, Entities: {len(entities['persons'])} persons")
+        # Look up the template this contract was generated from
+        template = plan = None
+        if template_lookup is not None:
+            from app.fingerprint import minhash_signature, build_plan, describe_match
+            signature = minhash_signature(text)
+            result["fingerprint"] = {"signature": signature, "text_length": len(text)}
+            template = template_lookup(signature)
+            if template and template.get("rule_locations"):
+                plan = build_plan(template["rule_locations"], template["text_length"], len(regex_text))
+                print(f"[INFO] Matched template {template['template_id']} (similarity {template['similarity']}), using fast path")
         
-        # Merge NER results into structured fields
-        if entities["persons"]:
-            fields["party_identification"]["persons"] = entities["persons"]
-        if entities["money"]:
-            fields["financial_details"]["money_entities"] = entities["money"]
-        if entities["dates"]:
-            fields["financial_details"]["dates"] = entities["dates"]
+        locations = {}
+        spans = {}
+        fields = extract_fields(regex_text, plan=plan, locations=locations, routes=build_routes(section_index), spans=spans)
+        if result["fingerprint"] is not None:
+            result["fingerprint"]["rule_locations"] = locations
+            result["template_match"] = describe_match(template, plan, locations)
+        publish("fields", {"fields": fields, "truncation": list(truncation)})
         
-        # Update result with extracted data
-        result.update(fields)
+        # Extract entities using spaCy NER
+        ner_text = text
+        max_ner_chars = budget.get("max_ner_chars")
+        if max_ner_chars and len(text) > max_ner_chars:
+            ner_text = text[:max_ner_chars]
+            truncation.append("ner_char_limit")
+        entities, ner_truncated = extract_entities_with_stats(ner_text, stage_deadline("ner_seconds"), spans=spans)
+        if ner_truncated:
+            truncation.append("ner_timeout")
+        print(f"[INFO] Found {len(entities['persons'])} persons, {len(entities['money'])} money entities")
+        publish("entities", {"entities": entities, "truncation": list(truncation)})
         
-        # Calculate weighted score
-        result["score"] = score_fields(fields)
-        result["processing_status"] = "completed"
+        finalize_result(result, text, entities, fields, truncation, text_stats)
+        result["field_locations"] = locate_values(fields, spans, text_stats["page_offsets"])
         
+        print(f"[INFO] Raw data stored - Text length: {len(text)}, Entities: {len(entities['persons'])} persons")
         print(f"[INFO] Contract processed successfully. Score: {result['score']}/100")
+        if truncation:
+            print(f"[WARNING] Extraction truncated by budget: {truncation}")
         
         # Log extracted data summary
         summary = {
@@ -332,6 +591,7 @@ def process_contract(pdf_path):
         print(f"[ERROR] Contract processing failed: {e}")
         result["processing_status"] = "failed"
         result["error"] = str(e)
+        result["error_type"] = type(e).__name__
         result["score"] = 0
         # ✅ Even on failure, store what we could extract
         if 'text' in locals():
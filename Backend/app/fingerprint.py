@@ -0,0 +1,138 @@
+# fingerprint.py
+"""
+MinHash signatures and LSH band keys for contract text.
+
+Text is normalised (lowercased, digits folded to 0 so amounts and dates do not
+hide a shared template) and split into word shingles. Signatures are stable across
+processes, so they can be stored and compared later.
+"""
+import hashlib
+import re
+import zlib
+import numpy as np
+from typing import Optional
+from app.config import (
+    MINHASH_PERMUTATIONS,
+    LSH_BANDS,
+    SHINGLE_WORDS,
+    TEMPLATE_WINDOW_MARGIN,
+    TEMPLATE_VARIATION_THRESHOLD,
+)
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_MAX_HASH = _MERSENNE_PRIME - 1
+_BATCH = 8192
+
+_rng = np.random.RandomState(20240101)
+_A = _rng.randint(1, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_DIGIT_RE = re.compile(r"\d")
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Unique 32-bit hashes of the word shingles of `text`."""
+    words = _WORD_RE.findall(_DIGIT_RE.sub("0", text.lower()))
+    if len(words) < SHINGLE_WORDS:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return np.unique(hashes)
+
+
+def minhash_signature(text: str) -> list:
+    """MinHash signature of `text` as a list of MINHASH_PERMUTATIONS ints."""
+    hashes = shingle_hashes(text) % _MERSENNE_PRIME
+    signature = np.full(MINHASH_PERMUTATIONS, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(hashes), _BATCH):
+        batch = hashes[start:start + _BATCH]
+        # (a * x + b) mod p stays below 2**63 because a, x < 2**31
+        permuted = (np.outer(_A, batch) + _B[:, None]) % _MERSENNE_PRIME
+        signature = np.minimum(signature, permuted.min(axis=1))
+    return signature.tolist()
+
+
+def band_keys(signature: list) -> list:
+    """LSH band keys; two signatures sharing any key are near-duplicate candidates."""
+    rows = len(signature) // LSH_BANDS
+    keys = []
+    for band in range(LSH_BANDS):
+        chunk = signature[band * rows:(band + 1) * rows]
+        digest = hashlib.blake2b(",".join(map(str, chunk)).encode("ascii"), digest_size=8).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+
+def estimate_similarity(a: list, b: list) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    if not a or len(a) != len(b):
+        return 0.0
+    return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+
+def build_plan(rule_locations: dict, template_length: int, text_length: int) -> dict:
+    """Turn a template's pattern match locations into search windows for a new document.
+
+    Offsets are scaled by the ratio of document lengths and widened by
+    TEMPLATE_WINDOW_MARGIN; overlapping windows are merged.
+    """
+    scale = text_length / template_length if template_length else 1.0
+    plan = {}
+    for pattern_id, spans in rule_locations.items():
+        windows = sorted(
+            [max(int(start * scale) - TEMPLATE_WINDOW_MARGIN, 0), min(int(end * scale) + TEMPLATE_WINDOW_MARGIN, text_length)]
+            for start, end in spans
+        )
+        merged = []
+        for start, end in windows:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        plan[pattern_id] = merged
+    return plan
+
+
+def _outside(span: list, windows: list) -> bool:
+    return not any(start <= span[0] and span[1] <= end for start, end in windows)
+
+
+def describe_match(template: Optional[dict], plan: Optional[dict], locations: dict) -> Optional[dict]:
+    """Summarise how a document deviates from its matched template.
+
+    missing_fields: rules the template matched that found nothing here.
+    added_fields: rules that matched here but not in the template.
+    extra_matches: rules with more matches than the template, or matches outside
+    its (scaled) locations, i.e. content added to a field the template also has.
+    """
+    if template is None:
+        return None
+    plan = plan or {}
+    template_locations = template.get("rule_locations") or {}
+    missing = set(plan) - set(locations)
+    added = set(locations) - set(plan)
+    extra = {
+        pattern_id for pattern_id, spans in locations.items()
+        if pattern_id in plan and (
+            len(spans) > len(template_locations.get(pattern_id, []))
+            or any(_outside(span, plan[pattern_id]) for span in spans)
+        )
+    }
+    
+    def rules(pattern_ids):
+        return sorted({pattern_id.split(":", 1)[0] for pattern_id in pattern_ids})
+    
+    missing_fields, added_fields, extra_matches = rules(missing), rules(added), rules(extra)
+    return {
+        "template_id": template["template_id"],
+        "similarity": template["similarity"],
+        "missing_fields": missing_fields,
+        "added_fields": added_fields,
+        "extra_matches": extra_matches,
+        "suspicious": (
+            template["similarity"] < TEMPLATE_VARIATION_THRESHOLD
+            or bool(missing_fields or added_fields or extra_matches)
+        )
+    }
@@ -3,19 +3,39 @@
 FastAPI entry point for Contract Intelligence Parser backend.
 """
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Query
-from fastapi.responses import FileResponse
+import tempfile
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from uuid import uuid4
 from datetime import datetime
 from typing import Optional
-from app.config import UPLOAD_DIR, MAX_FILE_SIZE_MB, ALLOWED_EXTENSIONS
+from app.config import UPLOAD_DIR, MAX_FILE_SIZE_MB, ALLOWED_EXTENSIONS, COMPRESSION_MIN_SIZE, DOWNLOAD_CACHE_MAX_AGE
 from app.db import contracts_collection
 from app.models import contract_metadata_dict
-from app.background import process_contract
+from app.background import extraction_scheduler, requeue_dead_letters, resume_unfinished_jobs, STRUCTURED_SECTIONS
+from app.scheduler import ExtractionJob, PRIORITY_CLASSES, estimate_cost
+from app.clients import get_client_id
+from app.templates import ensure_indexes as ensure_template_indexes, find_similar
+from app.dead_letters import ensure_indexes as ensure_dead_letter_indexes, build_dead_letter_query, list_dead_letters, summarize_dead_letters, get_dead_letter
+from app.worker import worker_pool
+from app.retention import retention_compactor, hydrate_text, contract_text, restore_pdf
+from app.cache import detail_cache
+from app.conditional import make_etag, is_not_modified, not_modified_response, validator_headers
+from app.compression import CompressionMiddleware
+from app.ratelimit import RateLimitMiddleware, rate_limiter
+from app.queries import build_filter_query, parse_fields, build_projection
+from app.responses import FastJSONResponse, dumps
+from app.storage import storage, content_hash, shard_key
+from app.downloads import RangeFileResponse, RangeNotSatisfiable, parse_range
+from app.export import ExportError, parse_columns, iter_contract_rows, stream_csv, stream_jsonl, export_contracts
 
-app = FastAPI(title="Contract Intelligence Parser API")
+app = FastAPI(title="Contract Intelligence Parser API", default_response_class=FastJSONResponse)
 
+# Innermost of the three, so CORS headers are added to 429 responses as well
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:5174", "http://localhost:5175"],
@@ -23,18 +43,59 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+@app.on_event("startup")
+def create_indexes():
+    try:
+        ensure_template_indexes()
+    except Exception as e:
+        print(f"[ERROR] Failed to create fingerprint indexes: {e}")
+    try:
+        ensure_dead_letter_indexes()
+    except Exception as e:
+        print(f"[ERROR] Failed to create dead-letter indexes: {e}")
+    try:
+        rate_limiter.store.ensure_indexes()
+    except Exception as e:
+        print(f"[ERROR] Failed to create rate limit indexes: {e}")
+
+@app.on_event("startup")
+def start_retention_compactor():
+    retention_compactor.start()
+
+@app.on_event("startup")
+def resume_extraction_jobs():
+    # Queued and backoff-delayed jobs only live in memory, so pick them up from the database
+    try:
+        resume_unfinished_jobs()
+    except Exception as e:
+        print(f"[ERROR] Failed to resume unfinished extraction jobs: {e}")
+
+@app.on_event("shutdown")
+def stop_extraction_workers():
+    extraction_scheduler.shutdown()
+    worker_pool.shutdown()
+    retention_compactor.shutdown()
+
 @app.get("/")
 def homePage():    
     return {"message":"hello"}
 
 @app.post("/contracts/upload")
-def upload_contract(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+def upload_contract(
+    request: Request,
+    file: UploadFile = File(...),
+    priority: str = Query("normal", description="Scheduling priority: high, normal or bulk")
+):
     """Upload a PDF contract file for processing."""
     
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail="Invalid priority. Use high, normal or bulk.")
+    
     # Validate file extension
     ext = os.path.splitext(file.filename)[1].lower()
     if ext not in ALLOWED_EXTENSIONS:
@@ -45,32 +106,44 @@ def upload_contract(background_tasks: BackgroundTasks, file: UploadFile = File(.
     if len(contents) > MAX_FILE_SIZE_MB * 1024 * 1024:
         raise HTTPException(status_code=400, detail=f"File too large. Maximum {MAX_FILE_SIZE_MB}MB allowed.")
     
-    # Generate unique contract ID and filename
+    # Generate unique contract ID and a hash-sharded storage key
     contract_id = str(uuid4())
-    filename = f"{contract_id}{ext}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    digest = content_hash(contents)
+    storage_key = shard_key(digest, f"{contract_id}{ext}")
     
-    # Save file to disk
+    # Save file to storage
     try:
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        storage.save(storage_key, contents)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    file_path = storage.locator(storage_key)
     
     # Create metadata and insert into database
     meta = contract_metadata_dict(file_path, file.filename)
     meta["contract_id"] = contract_id
+    meta["storage_key"] = storage_key
+    meta["file_sha256"] = digest
+    meta["file_size"] = len(contents)
+    
+    # Cost estimate (page count read from the PDF trailer) used to order the extraction queue
+    estimate = estimate_cost(contents)
+    client_id = get_client_id(request)
+    meta["estimated_pages"] = estimate["estimated_pages"]
+    meta["estimated_cost"] = estimate["estimated_cost"]
+    meta["priority"] = priority
+    meta["uploader"] = client_id
     
     try:
         contracts_collection.insert_one(meta)
     except Exception as e:
         # Clean up file if database insert fails
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        storage.delete(storage_key)
         raise HTTPException(status_code=500, detail=f"Failed to save metadata: {str(e)}")
     
-    # Start background processing
-    background_tasks.add_task(process_contract, contract_id, file_path)
+    # Queue for background processing
+    extraction_scheduler.submit(
+        ExtractionJob(contract_id, file_path, storage_key, client_id, priority, estimate["estimated_cost"])
+    )
     
     print(f"[INFO] Contract {contract_id} uploaded successfully: {file.filename}")
     
@@ -78,9 +151,27 @@ def upload_contract(background_tasks: BackgroundTasks, file: UploadFile = File(.
         "contract_id": contract_id,
         "original_filename": file.filename,
         "message": "File uploaded successfully and processing started.",
-        "status": "pending"
+        "status": "pending",
+        "priority": priority,
+        "estimated_pages": estimate["estimated_pages"]
     }
 
+# Requestable fields whose value includes the full text, which may be archived
+TEXT_FIELDS = {"raw_extracted_data", "raw_extracted_data.full_text", "raw_text"}
+
+def project_text_fields(doc: dict, field_paths: list) -> dict:
+    """Fill in archived text on a contract document fetched for `field_paths`.
+
+    raw_text is served from the deduplicated full text. Fields projected only to
+    find the text are dropped again.
+    """
+    if (TEXT_FIELDS - {"raw_text"}) & set(field_paths):
+        hydrate_text(doc)
+    requested = {path.split(".", 1)[0] for path in field_paths} | {"contract_id"}
+    if "raw_text" in requested:
+        doc["raw_text"] = contract_text(doc)
+    return {k: v for k, v in doc.items() if k in requested}
+
 @app.get("/contracts")
 def get_contracts(
     page: int = Query(1, ge=1, description="Page number (1-based)"),
@@ -90,26 +181,21 @@ def get_contracts(
     max_score: Optional[int] = Query(None, ge=0, le=100, description="Maximum confidence score"),
     sort_by: str = Query("created_at", description="Sort field: created_at, updated_at, score, original_filename"),
     sort_order: str = Query("desc", description="Sort order: asc or desc"),
-    search: Optional[str] = Query(None, description="Search in filename")
+    search: Optional[str] = Query(None, description="Search in filename"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. status,score,financial_details.amounts")
 ):
     """Get paginated list of contracts with filtering and sorting capabilities."""
     
-    # Build MongoDB filter query
-    filter_query = {}
-    
-    if status:
-        filter_query["status"] = status
-    
-    if min_score is not None or max_score is not None:
-        score_filter = {}
-        if min_score is not None:
-            score_filter["$gte"] = min_score
-        if max_score is not None:
-            score_filter["$lte"] = max_score
-        filter_query["score"] = score_filter
-    
-    if search:
-        filter_query["original_filename"] = {"$regex": search, "$options": "i"}
+    # Build MongoDB filter query and projection
+    filter_query = build_filter_query(status, min_score, max_score, search)
+    field_paths = parse_fields(fields)
+    # Archived full text is only read back when `fields` asks for it; the default
+    # listing returns the archive reference and leaves hydration to the detail endpoint
+    wants_text = field_paths is not None and bool(TEXT_FIELDS & set(field_paths))
+    always = ("contract_id",)
+    if wants_text:
+        always += ("archive", "raw_extracted_data.full_text") if "raw_text" in field_paths else ("archive",)
+    projection = build_projection(field_paths, always=always)
     
     # Calculate pagination
     skip = (page - 1) * limit
@@ -124,12 +210,15 @@ def get_contracts(
         
         # Get paginated results
         docs = list(
-            contracts_collection.find(filter_query, {"_id": 0})
+            contracts_collection.find(filter_query, projection)
             .sort(sort_query)
             .skip(skip)
             .limit(limit)
         )
         
+        if wants_text:
+            docs = [project_text_fields(doc, field_paths) for doc in docs]
+        
         # Calculate pagination metadata
         total_pages = (total_count + limit - 1) // limit
         has_next = page < total_pages
@@ -137,7 +226,7 @@ def get_contracts(
         
         print(f"[DEBUG] Retrieved {len(docs)} contracts (page {page}/{total_pages})")
         
-        return {
+        return FastJSONResponse({
             "contracts": docs,
             "pagination": {
                 "current_page": page,
@@ -153,42 +242,252 @@ def get_contracts(
                 "max_score": max_score,
                 "search": search,
                 "sort_by": sort_by,
-                "sort_order": sort_order
+                "sort_order": sort_order,
+                "fields": fields
             }
-        }
+        })
         
     except Exception as e:
         print(f"[ERROR] Failed to retrieve contracts: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve contracts")
 
+@app.get("/contracts/export")
+async def export_contract_data(
+    export_format: str = Query("csv", alias="format", description="Export format: csv, jsonl or parquet"),
+    status: Optional[str] = Query(None, description="Filter by status: pending, processing, completed, failed"),
+    min_score: Optional[int] = Query(None, ge=0, le=100, description="Minimum confidence score"),
+    max_score: Optional[int] = Query(None, ge=0, le=100, description="Maximum confidence score"),
+    sort_by: str = Query("created_at", description="Sort field: created_at, updated_at, score, original_filename"),
+    sort_order: str = Query("asc", description="Sort order: asc or desc"),
+    search: Optional[str] = Query(None, description="Search in filename"),
+    columns: Optional[str] = Query(None, description="Comma-separated export columns (default: all)")
+):
+    """Stream flattened extraction results for all matching contracts.
+
+    CSV and JSONL are streamed straight from the database cursor; Parquet is
+    written to a temporary file row group by row group in the threadpool, served,
+    and deleted once the response has been sent.
+    """
+    if export_format not in ("csv", "jsonl", "parquet"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use csv, jsonl or parquet.")
+    
+    try:
+        selected = parse_columns(columns)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filter_query = build_filter_query(status, min_score, max_score, search)
+    sort_query = [(sort_by, 1 if sort_order == "asc" else -1)]
+    filename = f"contracts-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    
+    print(f"[INFO] Exporting contracts as {export_format} with filter: {filter_query}")
+    
+    if export_format == "parquet":
+        fd, tmp_path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        try:
+            await run_in_threadpool(export_contracts, contracts_collection, "parquet", tmp_path, filter_query, selected, sort_query)
+        except ExportError as e:
+            os.remove(tmp_path)
+            raise HTTPException(status_code=501, detail=str(e))
+        except Exception as e:
+            os.remove(tmp_path)
+            print(f"[ERROR] Parquet export failed: {e}")
+            raise HTTPException(status_code=500, detail="Failed to export contracts")
+        return FileResponse(
+            tmp_path,
+            media_type="application/vnd.apache.parquet",
+            filename=filename,
+            background=BackgroundTask(os.remove, tmp_path)
+        )
+    
+    rows = iter_contract_rows(contracts_collection, filter_query, selected, sort_query)
+    if export_format == "csv":
+        body, media_type = stream_csv(rows, selected), "text/csv"
+    else:
+        body, media_type = stream_jsonl(rows), "application/x-ndjson"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/scheduler/stats")
+def get_scheduler_stats():
+    """Queue depth, running jobs and fair-share usage per client."""
+    return extraction_scheduler.stats()
+
+@app.get("/dead-letters")
+def get_dead_letters(
+    failure_kind: Optional[str] = Query(None, description="Filter by failure kind: transient or permanent"),
+    error_type: Optional[str] = Query(None, description="Filter by error type, e.g. PDFSyntaxError or worker_crashed"),
+    page: int = Query(1, ge=1, description="Page number (1-based)"),
+    limit: int = Query(50, ge=1, le=500, description="Number of dead letters per page")
+):
+    """Inspect contracts whose extraction failed for good, with counts by failure kind and error type."""
+    query = build_dead_letter_query(failure_kind, error_type)
+    summary = summarize_dead_letters(query)
+    return {
+        "summary": summary,
+        "page": page,
+        "limit": limit,
+        "dead_letters": list_dead_letters(query, skip=(page - 1) * limit, limit=limit)
+    }
+
+@app.get("/dead-letters/{contract_id}")
+def get_dead_letter_details(contract_id: str):
+    """Get the failure history of a dead-lettered contract."""
+    entry = get_dead_letter(contract_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Contract is not dead-lettered.")
+    return entry
+
+@app.post("/dead-letters/requeue")
+def requeue_dead_lettered_contracts(
+    contract_ids: Optional[str] = Query(None, description="Comma-separated contract IDs to requeue"),
+    failure_kind: Optional[str] = Query(None, description="Requeue only this failure kind: transient or permanent"),
+    error_type: Optional[str] = Query(None, description="Requeue only this error type"),
+    priority: Optional[str] = Query(None, description="Override the scheduling priority: high, normal or bulk"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum contracts to requeue")
+):
+    """Requeue dead-lettered contracts in bulk, selected by ID and/or failure classification."""
+    if priority is not None and priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail="Invalid priority. Use high, normal or bulk.")
+    ids = [cid.strip() for cid in contract_ids.split(",") if cid.strip()] if contract_ids else None
+    if not ids and not failure_kind and not error_type:
+        raise HTTPException(status_code=400, detail="Select dead letters by contract_ids, failure_kind or error_type.")
+    
+    return requeue_dead_letters(build_dead_letter_query(failure_kind, error_type, ids), limit, priority)
+
+@app.get("/retention/stats")
+def get_retention_stats():
+    """Retention policies, the last compaction run and total space reclaimed."""
+    return retention_compactor.stats()
+
+@app.post("/retention/run", status_code=202)
+def run_retention():
+    """Start a compaction run in the background."""
+    started = retention_compactor.trigger()
+    return {"started": started, "message": "Compaction started." if started else "Compaction is already running."}
+
+@app.get("/ratelimit/stats")
+def get_rate_limit_stats():
+    """Rate limits, rejections so far and uploads currently in flight."""
+    return rate_limiter.stats()
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters for the in-process contract detail cache."""
+    return detail_cache.stats()
+
 @app.get("/contracts/{contract_id}")
-def get_contract_details(contract_id: str, include_raw: bool = False):
-    """Get detailed contract information including extracted data, optionally include raw data."""
-    doc = contracts_collection.find_one({"contract_id": contract_id}, {"_id": 0})
+def get_contract_details(
+    contract_id: str,
+    request: Request,
+    include_raw: bool = False,
+    fields: Optional[str] = Query(None, description="Comma-separated stored fields to return instead of the full detail view")
+):
+    """Get detailed contract information including extracted data, optionally include raw data.
+
+    Supports conditional GET via ETag / Last-Modified derived from `updated_at`.
+    Serialized responses for completed contracts are served from an in-process cache.
+    """
+    field_paths = parse_fields(fields)
+    if field_paths is not None:
+        variant = "fields:" + ",".join(field_paths)
+    else:
+        variant = "raw" if include_raw else "summary"
+    cache_key = (contract_id, variant)
+    
+    cached = detail_cache.get(cache_key)
+    if cached is not None:
+        body, etag, last_modified = cached
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        return Response(body, media_type="application/json", headers=validator_headers(etag, last_modified))
+    
+    always = ("contract_id", "status", "updated_at", "archive")
+    if field_paths is not None and "raw_text" in field_paths:
+        # raw_text is served from the deduplicated full text
+        always += ("raw_extracted_data.full_text",)
+    projection = build_projection(field_paths, always=always)
+    doc = contracts_collection.find_one({"contract_id": contract_id}, projection)
     if not doc:
         raise HTTPException(status_code=404, detail="Contract not found.")
     
     print(f"[DEBUG] Retrieved contract {contract_id} with status: {doc.get('status')}")
     
+    last_modified = doc.get("updated_at")
+    etag = make_etag(contract_id, last_modified, doc.get("status"), variant)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    
+    if field_paths is not None:
+        # Sparse fieldset: return the projected document as stored
+        result = {"contract_id": contract_id, "status": doc.get("status")}
+        result.update(project_text_fields(doc, field_paths))
+    else:
+        result = build_contract_details(contract_id, doc, include_raw)
+    body = dumps(result)
+    
+    # Completed contracts only change when reprocessed, which invalidates the cache
+    if doc.get("status") == "completed":
+        detail_cache.set(cache_key, (body, etag, last_modified))
+    
+    return Response(body, media_type="application/json", headers=validator_headers(etag, last_modified))
+
+def build_contract_details(contract_id: str, doc: dict, include_raw: bool = False) -> dict:
+    """Build the detail response for a contract document."""
     # Check if contract processing is complete
     if doc.get("status") == "processing":
-        return {
+        sections_ready = doc.get("sections_ready", {})
+        result = {
             "contract_id": contract_id,
             "status": "processing",
-            "message": "Contract is still being processed. Please check back later.",
+            "message": "Contract is still being processed. Partial results are included as stages complete.",
             "created_at": doc.get("created_at"),
-            "file_path": doc.get("file_path")
+            "updated_at": doc.get("updated_at"),
+            "file_path": doc.get("file_path"),
+            "sections_ready": sections_ready
         }
+        # Return whatever stages have already been published
+        if sections_ready.get("text"):
+            raw_data = doc.get("raw_extracted_data", {})
+            result["raw_extracted_data"] = {
+                "text_length": raw_data.get("text_length", 0),
+                "processing_metadata": raw_data.get("processing_metadata", {})
+            }
+        if sections_ready.get("fields") or sections_ready.get("entities"):
+            for section in STRUCTURED_SECTIONS:
+                result[section] = doc.get(section, {})
+        return result
     
     if doc.get("status") == "failed":
         return {
             "contract_id": contract_id,
             "status": "failed",
             "error": doc.get("error", "Unknown error occurred"),
+            "failure_kind": doc.get("failure_kind"),
+            "attempts": doc.get("attempts"),
             "message": "Contract processing failed.",
             "created_at": doc.get("created_at"),
             "file_path": doc.get("file_path")
         }
+
+    if doc.get("status") == "retrying":
+        return {
+            "contract_id": contract_id,
+            "status": "retrying",
+            "error": doc.get("error", "Unknown error occurred"),
+            "failure_kind": doc.get("failure_kind"),
+            "attempts": doc.get("attempts"),
+            "next_retry_at": doc.get("next_retry_at"),
+            "message": "Contract processing failed with a transient error and will be retried.",
+            "created_at": doc.get("created_at"),
+            "updated_at": doc.get("updated_at"),
+            "file_path": doc.get("file_path")
+        }
     
     # Return all extracted data if processing is complete
     result = {
@@ -207,11 +506,16 @@ def get_contract_details(contract_id: str, include_raw: bool = False):
         "revenue_classification": doc.get("revenue_classification", {}),
         "service_level_agreements": doc.get("service_level_agreements", {}),
         "score": doc.get("score", 0),
+        "sections_ready": doc.get("sections_ready", {}),
+        "template_match": doc.get("template_match"),
+        "field_locations": doc.get("field_locations", {}),
         
         # Additional metadata
         "extraction_metadata": {
             "confidence_level": "high" if doc.get("score", 0) >= 80 else "medium" if doc.get("score", 0) >= 60 else "low",
             "data_completeness": f"{doc.get('score', 0)}%",
+            "truncated": doc.get("truncated", False),
+            "truncation_reasons": doc.get("truncation_reasons", []),
             "total_entities": (
                 len(doc.get("party_identification", {}).get("persons", [])) + 
                 len(doc.get("account_information", {}).get("emails", [])) +
@@ -222,7 +526,7 @@ def get_contract_details(contract_id: str, include_raw: bool = False):
     
     # ✅ NEW: Option to include or exclude raw data for performance
     if include_raw and "raw_extracted_data" in doc:
-        result["raw_extracted_data"] = doc["raw_extracted_data"]
+        result["raw_extracted_data"] = hydrate_text(doc)["raw_extracted_data"]
     elif "raw_extracted_data" in doc:
         # Keep only summary info, remove full text for performance
         raw_data = doc["raw_extracted_data"]
@@ -235,10 +539,52 @@ def get_contract_details(contract_id: str, include_raw: bool = False):
     print(f"[DEBUG] Returning contract data with score: {result['score']}")
     return result
 
+@app.get("/contracts/{contract_id}/similar")
+def get_similar_contracts(
+    contract_id: str,
+    threshold: float = Query(0.8, ge=0, le=1, description="Minimum estimated similarity"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum near-duplicates to return")
+):
+    """Get the template cluster and near-duplicates of a completed contract."""
+    result = find_similar(contract_id, threshold, limit)
+    if result is None:
+        if not contracts_collection.find_one({"contract_id": contract_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Contract not found.")
+        raise HTTPException(status_code=404, detail="Contract has not been fingerprinted. Only completed contracts are indexed.")
+    
+    print(f"[DEBUG] Found {len(result['near_duplicates'])} near-duplicates for contract {contract_id}")
+    return result
+
+@app.get("/contracts/{contract_id}/sections")
+def get_contract_sections(contract_id: str):
+    """Get the page/section index of a contract and where each extracted value was found."""
+    doc = contracts_collection.find_one(
+        {"contract_id": contract_id},
+        {"_id": 0, "status": 1, "section_index": 1, "field_locations": 1}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Contract not found.")
+    if not doc.get("section_index"):
+        raise HTTPException(status_code=404, detail="Contract has not been segmented yet.")
+    
+    section_index = doc["section_index"]
+    print(f"[DEBUG] Returning {len(section_index.get('sections', []))} sections for contract {contract_id}")
+    return {
+        "contract_id": contract_id,
+        "status": doc.get("status"),
+        "pages": section_index.get("pages", []),
+        "sections": section_index.get("sections", []),
+        "field_locations": doc.get("field_locations", {})
+    }
+
 @app.get("/contracts/{contract_id}/status")
 def get_contract_status(contract_id: str):
     """Get contract processing status with progress information."""
-    doc = contracts_collection.find_one({"contract_id": contract_id})
+    doc = contracts_collection.find_one(
+        {"contract_id": contract_id},
+        {"_id": 0, "status": 1, "created_at": 1, "updated_at": 1, "error": 1, "score": 1, "sections_ready": 1,
+         "failure_kind": 1, "attempts": 1, "next_retry_at": 1}
+    )
     if not doc:
         raise HTTPException(status_code=404, detail="Contract not found.")
     
@@ -248,23 +594,35 @@ def get_contract_status(contract_id: str):
     progress_map = {
         "pending": 0,
         "processing": 50,
+        "retrying": 5,
         "completed": 100,
         "failed": 0
     }
     
     progress_percentage = progress_map.get(status, 0)
     
+    # While processing, advance progress as each extraction stage is published
+    sections_ready = doc.get("sections_ready", {})
+    if status == "processing":
+        stage_weights = {"text": 20, "fields": 20, "entities": 40, "score": 10}
+        progress_percentage = 10 + sum(w for stage, w in stage_weights.items() if sections_ready.get(stage))
+    
     result = {
         "contract_id": contract_id,
         "status": status,
         "progress_percentage": progress_percentage,
+        "sections_ready": sections_ready,
         "created_at": doc["created_at"],
         "updated_at": doc["updated_at"]
     }
     
-    # Add error details if failed
-    if status == "failed" and doc.get("error"):
+    # Add error details if failed or waiting to retry
+    if status in ("failed", "retrying") and doc.get("error"):
         result["error_details"] = doc["error"]
+        result["failure_kind"] = doc.get("failure_kind")
+        result["attempts"] = doc.get("attempts")
+    if status == "retrying":
+        result["next_retry_at"] = doc.get("next_retry_at")
     
     # Add score if completed
     if status == "completed" and doc.get("score") is not None:
@@ -280,7 +638,7 @@ def get_contract_raw_data(contract_id: str):
     try:
         contract = contracts_collection.find_one(
             {"contract_id": contract_id}, 
-            {"raw_extracted_data": 1, "original_filename": 1, "status": 1, "_id": 0}
+            {"raw_extracted_data": 1, "original_filename": 1, "status": 1, "archive": 1, "_id": 0}
         )
         if not contract:
             raise HTTPException(status_code=404, detail="Contract not found")
@@ -291,7 +649,7 @@ def get_contract_raw_data(contract_id: str):
                 detail=f"Contract processing not completed. Current status: {contract.get('status', 'unknown')}"
             )
         
-        raw_data = contract.get("raw_extracted_data", {})
+        raw_data = hydrate_text(contract).get("raw_extracted_data", {})
         if not raw_data:
             raise HTTPException(status_code=404, detail="No raw extracted data found for this contract")
         
@@ -311,31 +669,76 @@ def get_contract_raw_data(contract_id: str):
         print(f"[ERROR] Failed to retrieve raw data for contract {contract_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve raw data: {str(e)}")
 
-@app.get("/contracts/{contract_id}/download")
-def download_contract(contract_id: str):
-    """Download the original contract file."""
-    doc = contracts_collection.find_one({"contract_id": contract_id})
+@app.api_route("/contracts/{contract_id}/download", methods=["GET", "HEAD"])
+def download_contract(
+    contract_id: str,
+    request: Request,
+    disposition: str = Query("attachment", description="attachment or inline (for in-browser PDF viewers)")
+):
+    """Download the original contract file.
+
+    Supports single byte-range requests (206 Partial Content), If-Range, and
+    conditional requests against a strong ETag derived from the content hash.
+    """
+    doc = contracts_collection.find_one(
+        {"contract_id": contract_id},
+        {"_id": 0, "file_path": 1, "storage_key": 1, "file_sha256": 1, "original_filename": 1, "created_at": 1, "archive": 1}
+    )
     if not doc:
         raise HTTPException(status_code=404, detail="Contract not found.")
     
-    file_path = doc["file_path"]
-    if not os.path.exists(file_path):
+    # Files moved to the archive tier are restored to the hot tier on first access
+    try:
+        backend, key = restore_pdf(contract_id, doc)
+    except Exception as e:
+        print(f"[ERROR] Failed to restore archived file for contract {contract_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to restore archived contract file.")
+    if not backend.exists(key):
         raise HTTPException(status_code=404, detail="Contract file not found on server.")
+    size = backend.size(key)
+    
+    # Files are immutable once uploaded, so the content hash is a strong validator
+    if doc.get("file_sha256"):
+        etag = f'"{doc["file_sha256"]}"'
+    else:
+        etag = make_etag(contract_id, size, doc.get("created_at"), weak=True)
+    last_modified = doc.get("created_at")
+    cache_control = f"private, max-age={DOWNLOAD_CACHE_MAX_AGE}"
+    
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified, cache_control)
     
     # Get original filename, fallback to generated filename
     original_filename = doc.get("original_filename", f"{contract_id}.pdf")
+    disposition = "inline" if disposition == "inline" else "attachment"
     
-    print(f"[INFO] Downloading contract {contract_id}: {original_filename}")
+    headers = validator_headers(etag, last_modified, cache_control)
+    headers["Accept-Ranges"] = "bytes"
+    headers["Content-Disposition"] = f'{disposition}; filename="{original_filename}"'
     
-    return FileResponse(
-        file_path,
-        media_type="application/pdf",
-        filename=original_filename,
-        headers={
-            "Content-Disposition": f'attachment; filename="{original_filename}"',
-            "Cache-Control": "no-cache"
-        }
-    )
+    # A Range is only honoured if If-Range (when sent) still matches the current file
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        range_header = None
+    
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable.",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    
+    if byte_range is None:
+        print(f"[INFO] Downloading contract {contract_id}: {original_filename}")
+        return RangeFileResponse(backend, key, 0, size - 1, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    print(f"[DEBUG] Serving bytes {start}-{end}/{size} of contract {contract_id}")
+    return RangeFileResponse(backend, key, start, end, status_code=206, headers=headers)
 
 
 # start.py
@@ -2,6 +2,12 @@
 from datetime import datetime
 from uuid import uuid4
 
+# Extraction stages published incrementally while a contract is processing
+EXTRACTION_STAGES = ("text", "fields", "entities", "score")
+
+def empty_sections_ready():
+    return {stage: False for stage in EXTRACTION_STAGES}
+
 def contract_metadata_dict(file_path: str, original_filename: str = None):
     now = datetime.utcnow()
     return {
@@ -11,9 +17,9 @@ def contract_metadata_dict(file_path: str, original_filename: str = None):
         "original_filename": original_filename or "unknown.pdf",
         "created_at": now,
         "updated_at": now,
-        "raw_text": None,
         "raw_extracted_data": {},  # ✅ NEW: Field for comprehensive raw data
-        "score": 0
+        "score": 0,
+        "sections_ready": empty_sections_ready()
     }
 
 # ✅ NEW: Updated contract schema for reference
@@ -22,7 +28,7 @@ contract_schema_dict = {
     "filename": str,
     "original_filename": str,
     "file_size": int,
-    "status": str,  # processing, completed, failed
+    "status": str,  # pending, processing, retrying, completed, failed
     "created_at": str,
     "updated_at": str,
     
@@ -44,6 +50,24 @@ contract_schema_dict = {
     "service_level_agreements": dict,
     
     "score": int,
+    "truncated": bool,  # extraction stopped early because a budget was exceeded
+    "truncation_reasons": list,
+    "template_match": dict,  # {"template_id", "similarity", "missing_fields", "added_fields", "extra_matches", "suspicious"} or None
+    "sections_ready": dict,  # {"text", "fields", "entities", "score"} -> bool, set as each stage is stored
+    "attempts": int,  # extraction attempts made; transient failures are retried with backoff
+    "failure_kind": str,  # "transient" or "permanent" after a failure, else None
+    "next_retry_at": datetime,  # while status is "retrying"
+    "failure_history": list,  # [{"attempt", "error", "error_type", "kind", "at"}], most recent last
+    "section_index": dict,  # {"pages": [page start offsets], "sections": [{start, end, page, kind, heading}]}
+    "field_locations": dict,  # {section: {field: [{"value", "start", "end", "page"}]}} character offsets into raw_extracted_data.full_text
     "file_path": str,
+    "storage_key": str,  # hash-sharded key in the storage backend, e.g. "ab/cd/<contract_id>.pdf"
+    "file_sha256": str,  # content hash, used as the download ETag
+    "estimated_pages": int,  # read from the PDF trailer at upload; None if unknown
+    "estimated_cost": float,  # scheduling cost in pages
+    "priority": str,  # high, normal or bulk
+    "uploader": str,  # client identity used for fair-share scheduling
+    # Retention: set once text / the PDF has moved to the archive tier (see app.retention)
+    "archive": dict,  # {"text_key", "text_bytes", "text_archived_bytes", "text_archived_at", "pdf_key", "pdf_bytes", "pdf_archived_bytes", "pdf_archived_at", "pdf_restored_at", "pdf_skipped_reason", "pdf_skipped_at", "raw_text_differs"}
     "processing_status": str
 }
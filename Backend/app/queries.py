@@ -0,0 +1,103 @@
+# queries.py
+"""
+Shared MongoDB query helpers for the contract listing and export endpoints.
+"""
+import re
+from typing import Optional, List
+from fastapi import HTTPException
+
+# Top-level document fields that may be requested via `fields=`
+PROJECTABLE_FIELDS = {
+    "contract_id",
+    "status",
+    "original_filename",
+    "file_path",
+    "created_at",
+    "updated_at",
+    "score",
+    "error",
+    "failure_kind",
+    "attempts",
+    "party_identification",
+    "account_information",
+    "financial_details",
+    "payment_structure",
+    "revenue_classification",
+    "service_level_agreements",
+    "raw_text",
+    "raw_extracted_data",
+    "section_index",
+    "field_locations",
+    "archive",
+}
+
+_FIELD_PATH_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def build_filter_query(
+    status: Optional[str] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    search: Optional[str] = None,
+) -> dict:
+    """Build the MongoDB filter used by the contract list endpoint."""
+    filter_query = {}
+    
+    if status:
+        filter_query["status"] = status
+    
+    if min_score is not None or max_score is not None:
+        score_filter = {}
+        if min_score is not None:
+            score_filter["$gte"] = min_score
+        if max_score is not None:
+            score_filter["$lte"] = max_score
+        filter_query["score"] = score_filter
+    
+    if search:
+        filter_query["original_filename"] = {"$regex": search, "$options": "i"}
+    
+    return filter_query
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated `fields=` parameter into a list of field paths.
+
+    Dotted paths (e.g. `financial_details.amounts`) select nested values. Returns
+    None when no fieldset was requested. Raises 400 on unknown fields.
+    """
+    if not fields:
+        return None
+    
+    paths = []
+    for raw in fields.split(","):
+        path = raw.strip()
+        if not path:
+            continue
+        if not _FIELD_PATH_RE.match(path) or path.split(".", 1)[0] not in PROJECTABLE_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {path}")
+        if path not in paths:
+            paths.append(path)
+    
+    if not paths:
+        return None
+    
+    # MongoDB rejects projections where one path is a prefix of another
+    return [
+        p for p in paths
+        if not any(p != other and p.startswith(other + ".") for other in paths)
+    ]
+
+
+def build_projection(paths: Optional[List[str]], always: tuple = ("contract_id",)) -> dict:
+    """Build a MongoDB projection from parsed field paths."""
+    if paths is None:
+        return {"_id": 0}
+    
+    projection = {"_id": 0}
+    candidates = list(always) + paths
+    for path in candidates:
+        # MongoDB rejects a path alongside one of its ancestors; the ancestor covers it
+        if not any(path.startswith(other + ".") for other in candidates):
+            projection[path] = 1
+    return projection
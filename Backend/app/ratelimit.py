@@ -0,0 +1,325 @@
+# ratelimit.py
+"""
+ASGI middleware for per-client rate limiting and upload admission control.
+
+Every request is charged against a token bucket keyed by client (configured
+API key or remote address, see app.clients) and route class, so a client polling
+status as fast as it can only exhausts its own polling budget. Buckets live in
+an in-process store by default, or in MongoDB when several API processes must
+share limits. Uploads are additionally capped by concurrent requests and
+in-flight bytes (from Content-Length) before their bodies are read, so excess
+load is shed with 429/503 and Retry-After instead of queueing 50 MB reads.
+"""
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+import orjson
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from app.config import (
+    MAX_FILE_SIZE_MB,
+    RATE_LIMIT_UPLOAD_PER_MINUTE,
+    RATE_LIMIT_UPLOAD_BURST,
+    RATE_LIMIT_STATUS_PER_MINUTE,
+    RATE_LIMIT_STATUS_BURST,
+    RATE_LIMIT_DOWNLOAD_PER_MINUTE,
+    RATE_LIMIT_DOWNLOAD_BURST,
+    RATE_LIMIT_DEFAULT_PER_MINUTE,
+    RATE_LIMIT_DEFAULT_BURST,
+    RATE_LIMIT_MAX_BUCKETS,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_BACKEND,
+    UPLOAD_MAX_CONCURRENT,
+    UPLOAD_MAX_CONCURRENT_PER_CLIENT,
+    UPLOAD_MAX_INFLIGHT_MB,
+)
+from app.clients import get_client_id
+
+EXEMPT_PATHS = {"/", "/docs", "/redoc", "/openapi.json", "/docs/oauth2-redirect"}
+
+# Multipart framing on top of the file itself
+UPLOAD_OVERHEAD_BYTES = 1024 * 1024
+
+
+class RateLimit:
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0  # tokens per second
+        self.capacity = max(burst, 1)
+        self.per_minute = per_minute
+
+
+# (route class, method, path pattern); the first match wins, anything else is "default"
+ROUTE_CLASSES = [
+    ("upload", "POST", re.compile(r"^/contracts/upload/?$")),
+    ("download", "GET", re.compile(r"^/contracts/export/?$")),
+    ("download", None, re.compile(r"^/contracts/[^/]+/download/?$")),
+    ("status", "GET", re.compile(r"^/contracts/[^/]+/status/?$")),
+    ("status", "GET", re.compile(r"^/contracts/[^/]+/?$")),
+]
+
+DEFAULT_LIMITS = {
+    "upload": RateLimit(RATE_LIMIT_UPLOAD_PER_MINUTE, RATE_LIMIT_UPLOAD_BURST),
+    "status": RateLimit(RATE_LIMIT_STATUS_PER_MINUTE, RATE_LIMIT_STATUS_BURST),
+    "download": RateLimit(RATE_LIMIT_DOWNLOAD_PER_MINUTE, RATE_LIMIT_DOWNLOAD_BURST),
+    "default": RateLimit(RATE_LIMIT_DEFAULT_PER_MINUTE, RATE_LIMIT_DEFAULT_BURST),
+}
+
+
+def route_class(method: str, path: str) -> str:
+    for name, route_method, pattern in ROUTE_CLASSES:
+        if (route_method is None or route_method == method) and pattern.match(path):
+            return name
+    return "default"
+
+
+def refill(tokens: float, elapsed: float, limit: RateLimit, cost: float):
+    """Token bucket step: returns (allowed, tokens left, seconds until `cost` tokens are available)."""
+    tokens = min(limit.capacity, tokens + max(elapsed, 0) * limit.rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / limit.rate if limit.rate > 0 else 60.0
+
+
+class MemoryRateLimitStore:
+    """Token buckets for this process only, bounded by LRU eviction."""
+    blocking = False
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()  # key -> (tokens, updated monotonic)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: RateLimit, cost: float = 1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            allowed, tokens, retry_after = refill(tokens, now - updated, limit, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+    def ensure_indexes(self):
+        pass
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class MongoRateLimitStore:
+    """Token buckets shared through MongoDB, updated with optimistic concurrency.
+
+    Idle buckets expire through a TTL index once they would be full again.
+    """
+    blocking = True
+
+    def __init__(self, collection, max_conflicts: int = 5):
+        self.collection = collection
+        self.max_conflicts = max_conflicts
+
+    def ensure_indexes(self):
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def take(self, key: str, limit: RateLimit, cost: float = 1):
+        for _ in range(self.max_conflicts):
+            now = time.time()
+            doc = self.collection.find_one({"_id": key})
+            tokens, updated = (doc["tokens"], doc["updated"]) if doc else (limit.capacity, now)
+            allowed, tokens, retry_after = refill(tokens, now - updated, limit, cost)
+            refill_seconds = (limit.capacity - tokens) / limit.rate if limit.rate > 0 else 60.0
+            state = {"tokens": tokens, "updated": now, "expires_at": datetime.utcnow() + timedelta(seconds=refill_seconds + 1)}
+            if doc is None:
+                try:
+                    self.collection.insert_one(dict(state, _id=key))
+                except DuplicateKeyError:
+                    continue
+            elif self.collection.update_one({"_id": key, "updated": updated}, {"$set": state}).matched_count == 0:
+                # Another process updated the bucket first; recompute from its state
+                continue
+            return allowed, tokens, retry_after
+        # Heavy contention on one bucket: let the request through rather than stall it
+        print(f"[WARNING] Rate limit bucket {key} contended, allowing request")
+        return True, 0.0, 0.0
+
+    def size(self) -> int:
+        return self.collection.estimated_document_count()
+
+
+def create_rate_limit_store(backend: str):
+    if backend == "mongo":
+        from app.db import rate_limits_collection
+        return MongoRateLimitStore(rate_limits_collection)
+    if backend != "memory":
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+    return MemoryRateLimitStore()
+
+
+class UploadAdmission:
+    """Caps concurrent uploads and their bytes in flight, overall and per client."""
+
+    def __init__(self, max_concurrent: int, max_per_client: int, max_bytes: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.in_flight_bytes = 0
+        self._per_client = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client_id: str, nbytes: int) -> Optional[tuple]:
+        """Reserve a slot; returns None on success, else (status code, reason)."""
+        with self._lock:
+            if self.max_per_client and self._per_client.get(client_id, 0) >= self.max_per_client:
+                return 429, "Too many concurrent uploads from this client."
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                return 503, "Upload capacity exhausted, try again shortly."
+            # A single upload larger than the byte budget is admitted only when nothing else is in flight
+            if self.max_bytes and self.in_flight and self.in_flight_bytes + nbytes > self.max_bytes:
+                return 503, "Upload capacity exhausted, try again shortly."
+            self.in_flight += 1
+            self.in_flight_bytes += nbytes
+            self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+            return None
+
+    def release(self, client_id: str, nbytes: int):
+        with self._lock:
+            self.in_flight -= 1
+            self.in_flight_bytes -= nbytes
+            self._per_client[client_id] -= 1
+            if not self._per_client[client_id]:
+                del self._per_client[client_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "in_flight_bytes": self.in_flight_bytes,
+                "max_concurrent": self.max_concurrent,
+                "max_concurrent_per_client": self.max_per_client,
+                "max_in_flight_bytes": self.max_bytes,
+                "clients": dict(self._per_client),
+            }
+
+
+async def _reject(send, status_code: int, detail: str, retry_after: float, extra_headers: Optional[dict] = None):
+    body = orjson.dumps({"detail": detail})
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(max(math.ceil(retry_after), 1)).encode()),
+    ]
+    for name, value in (extra_headers or {}).items():
+        headers.append((name.lower().encode(), str(value).encode()))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimiter:
+    """Buckets, limits and admission state shared by the middleware and the stats endpoint."""
+
+    def __init__(self, store, limits: dict, admission: Optional[UploadAdmission] = None, enabled: bool = True):
+        self.store = store
+        self.limits = limits
+        self.admission = admission
+        self.enabled = enabled
+        self.rejected = {}
+
+    def count_rejection(self, reason: str):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    async def take(self, key: str, limit: RateLimit):
+        try:
+            if self.store.blocking:
+                return await run_in_threadpool(self.store.take, key, limit)
+            return self.store.take(key, limit)
+        except Exception as e:
+            # A failing shared store must not take the API down with it
+            print(f"[ERROR] Rate limit store failed, allowing request: {e}")
+            return True, float(limit.capacity), 0.0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.store).__name__,
+            "buckets": self.store.size(),
+            "limits": {name: {"per_minute": limit.per_minute, "burst": limit.capacity} for name, limit in self.limits.items()},
+            "rejected": dict(self.rejected),
+            "uploads": self.admission.stats() if self.admission else None,
+        }
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter
+        if scope["type"] != "http" or not limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        if method == "OPTIONS" or path in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        client_id = get_client_id(Request(scope))
+        name = route_class(method, path)
+        limit = limiter.limits.get(name) or limiter.limits["default"]
+        limit_headers = {"X-RateLimit-Limit": f"{limit.per_minute:g}/min"}
+
+        allowed, remaining, retry_after = await limiter.take(f"{client_id}|{name}", limit)
+        if not allowed:
+            limiter.count_rejection(name)
+            await _reject(send, 429, "Rate limit exceeded.", retry_after, dict(limit_headers, **{"X-RateLimit-Remaining": 0}))
+            return
+        limit_headers["X-RateLimit-Remaining"] = int(remaining)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for header, value in limit_headers.items():
+                    headers[header] = str(value)
+            await send(message)
+
+        if name != "upload" or limiter.admission is None:
+            await self.app(scope, receive, send_wrapper)
+            return
+
+        # Admission control runs before the body is read
+        content_length = Headers(scope=scope).get("content-length")
+        max_body = MAX_FILE_SIZE_MB * 1024 * 1024 + UPLOAD_OVERHEAD_BYTES
+        try:
+            nbytes = int(content_length) if content_length is not None else max_body
+        except ValueError:
+            nbytes = max_body
+        if nbytes > max_body:
+            limiter.count_rejection("upload_too_large")
+            await _reject(send, 413, f"File too large. Maximum {MAX_FILE_SIZE_MB}MB allowed.", 1)
+            return
+
+        refused = limiter.admission.acquire(client_id, nbytes)
+        if refused is not None:
+            status_code, detail = refused
+            limiter.count_rejection("upload_concurrency" if status_code == 429 else "upload_capacity")
+            await _reject(send, status_code, detail, 1, limit_headers)
+            return
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            limiter.admission.release(client_id, nbytes)
+
+
+rate_limiter = RateLimiter(
+    create_rate_limit_store(RATE_LIMIT_BACKEND),
+    DEFAULT_LIMITS,
+    UploadAdmission(UPLOAD_MAX_CONCURRENT, UPLOAD_MAX_CONCURRENT_PER_CLIENT, UPLOAD_MAX_INFLIGHT_MB * 1024 * 1024),
+    enabled=bool(RATE_LIMIT_ENABLED)
+)
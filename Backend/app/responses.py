@@ -0,0 +1,23 @@
+# responses.py
+"""
+Fast JSON serialization for API responses using orjson.
+"""
+import orjson
+from fastapi.responses import ORJSONResponse
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content) -> bytes:
+    """Serialize content to JSON bytes. Datetimes are emitted in ISO 8601 format."""
+    return orjson.dumps(content, default=str, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse that tolerates non-JSON types (e.g. ObjectId) by stringifying them.
+
+    Returning this directly from an endpoint also skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,353 @@
+# retention.py
+"""
+Tiered retention for extracted text and uploaded PDFs.
+
+The hot tier is the `contracts` collection plus the uploaded files in the storage
+backend. Past the per-status age in RETENTION_TEXT_POLICY / RETENTION_PDF_POLICY,
+the compactor moves a contract's full text and its PDF into gzip blobs under
+`archive/` in the same storage backend, leaving a slim contract record (structured
+fields, score, summaries) hot. It also drops the legacy `raw_text` field, which
+duplicates `raw_extracted_data.full_text`.
+
+Archived data is restored on access: text is read through from the archive when
+a response needs it, and an archived PDF is moved back to the hot tier when it is
+downloaded or reprocessed.
+"""
+import gzip
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+import orjson
+from app.config import (
+    RETENTION_TEXT_POLICY,
+    RETENTION_PDF_POLICY,
+    RETENTION_INTERVAL_SECONDS,
+    RETENTION_BATCH_SIZE,
+    RETENTION_MAX_BYTES_PER_SECOND,
+)
+from app.db import contracts_collection
+from app.cache import detail_cache
+from app.storage import storage, storage_for, content_hash, shard_key
+
+ARCHIVE_PREFIX = "archive"
+GZIP_LEVEL = 6
+
+# Striped locks serialising restores of the same contract within this process
+_RESTORE_LOCKS = [threading.Lock() for _ in range(64)]
+
+# Statuses whose contracts can change underneath the compactor are never archived
+ARCHIVABLE_STATUSES = {"completed", "failed"}
+
+
+def parse_retention_policy(value: str) -> dict:
+    """Parse "completed=90,failed=30" into {status: days}."""
+    policy = {}
+    for item in value.split(","):
+        status, sep, days = item.strip().partition("=")
+        if not sep:
+            continue
+        if status not in ARCHIVABLE_STATUSES:
+            print(f"[WARNING] Ignoring retention policy for non-archivable status: {item}")
+            continue
+        try:
+            policy[status] = float(days)
+        except ValueError:
+            print(f"[WARNING] Ignoring invalid retention policy: {item}")
+    return policy
+
+
+def archive_key(contract_id: str, suffix: str) -> str:
+    return f"{ARCHIVE_PREFIX}/{shard_key(content_hash(contract_id.encode()), contract_id + suffix)}"
+
+
+def load_archived_text(doc: dict) -> Optional[str]:
+    text_key = doc.get("archive", {}).get("text_key")
+    if not text_key:
+        return None
+    return orjson.loads(gzip.decompress(storage.read(text_key)))["full_text"]
+
+
+def contract_text(doc: dict) -> Optional[str]:
+    """Full extracted text of a contract from whichever tier holds it."""
+    raw_data = doc.get("raw_extracted_data") or {}
+    text = raw_data.get("full_text") or doc.get("raw_text")
+    return text if text is not None else load_archived_text(doc)
+
+
+def hydrate_text(doc: dict) -> dict:
+    """Fill in `raw_extracted_data.full_text` from the archive tier if it was archived."""
+    raw_data = doc.get("raw_extracted_data")
+    if isinstance(raw_data, dict) and raw_data.get("full_text") is None:
+        text = load_archived_text(doc)
+        if text is not None:
+            raw_data["full_text"] = text
+    return doc
+
+
+def restore_pdf(contract_id: str, doc: dict):
+    """Move an archived PDF back to the hot tier; returns (backend, key) for the file.
+
+    Safe to call concurrently: only one caller per contract restores the file and
+    the others find it already hot.
+    """
+    backend, key = storage_for(doc)
+    if not doc.get("archive", {}).get("pdf_key"):
+        return backend, key
+
+    with _RESTORE_LOCKS[hash(contract_id) % len(_RESTORE_LOCKS)]:
+        # The file may have been restored while this request waited
+        current = contracts_collection.find_one({"contract_id": contract_id}, {"_id": 0, "archive.pdf_key": 1}) or {}
+        pdf_key = current.get("archive", {}).get("pdf_key")
+        if not pdf_key:
+            return backend, key
+        try:
+            blob = storage.read(pdf_key)
+        except Exception:
+            # Another API process restored it and removed the archive copy
+            if backend.exists(key):
+                return backend, key
+            raise
+
+        data = gzip.decompress(blob)
+        if doc.get("file_sha256") and content_hash(data) != doc["file_sha256"]:
+            raise ValueError(f"Archived file for contract {contract_id} does not match its content hash")
+        backend.save(key, data)
+        contracts_collection.update_one(
+            {"contract_id": contract_id},
+            {
+                "$set": {"archive.pdf_restored_at": datetime.utcnow()},
+                "$unset": {"archive.pdf_key": "", "archive.pdf_bytes": "", "archive.pdf_archived_bytes": "", "archive.pdf_archived_at": ""}
+            }
+        )
+        storage.delete(pdf_key)
+    print(f"[INFO] Restored archived file for contract {contract_id} ({len(data)} bytes)")
+    return backend, key
+
+
+def _empty_report() -> dict:
+    return {
+        "raw_text_deduplicated": 0,
+        "text_archived": 0,
+        "pdfs_archived": 0,
+        "pdfs_skipped": 0,
+        "hot_bytes_reclaimed": 0,
+        "archive_bytes_written": 0,
+        "errors": 0,
+    }
+
+
+class RetentionCompactor:
+    """Runs the retention passes in a background thread, throttled to a byte rate."""
+
+    def __init__(
+        self,
+        text_policy: dict,
+        pdf_policy: dict,
+        interval: float = RETENTION_INTERVAL_SECONDS,
+        batch_size: int = RETENTION_BATCH_SIZE,
+        max_bytes_per_second: int = RETENTION_MAX_BYTES_PER_SECOND,
+    ):
+        self.text_policy = text_policy
+        self.pdf_policy = pdf_policy
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_bytes_per_second = max_bytes_per_second
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._running = False
+        self.last_report = None
+        self.totals = _empty_report()
+
+    def _throttle(self, nbytes: int):
+        if self.max_bytes_per_second > 0 and nbytes:
+            self._stop.wait(nbytes / self.max_bytes_per_second)
+
+    def _candidates(self, policy: dict, query: dict, projection: dict, cutoff_fields: tuple = ()):
+        """Oldest documents past the policy age per status.
+
+        Everything a pass would skip must be excluded here, or a batch full of
+        skipped documents would be picked again on every run.
+        """
+        now = datetime.utcnow()
+        for status, days in policy.items():
+            cutoff = now - timedelta(days=days)
+            status_query = dict(query, status=status, updated_at={"$lt": cutoff})
+            # Fields such as archive.pdf_restored_at restart the retention period
+            for field in cutoff_fields:
+                status_query.setdefault("$and", []).append({"$or": [{field: {"$exists": False}}, {field: {"$lt": cutoff}}]})
+            cursor = contracts_collection.find(status_query, projection).sort("updated_at", 1).limit(self.batch_size)
+            for doc in cursor:
+                if self._stop.is_set():
+                    return
+                yield doc
+
+    def _dedupe_raw_text(self, report: dict):
+        query = {
+            "status": {"$in": list(ARCHIVABLE_STATUSES)},
+            "raw_text": {"$type": "string"},
+            "raw_extracted_data.full_text": {"$type": "string"},
+            "archive.raw_text_differs": {"$exists": False}
+        }
+        projection = {"_id": 0, "contract_id": 1, "raw_text": 1, "raw_extracted_data.full_text": 1}
+        for doc in contracts_collection.find(query, projection).limit(self.batch_size):
+            if self._stop.is_set():
+                return
+            if doc["raw_text"] != doc["raw_extracted_data"]["full_text"]:
+                # Not a duplicate; it goes when the text is archived
+                contracts_collection.update_one({"contract_id": doc["contract_id"]}, {"$set": {"archive.raw_text_differs": True}})
+                continue
+            contracts_collection.update_one({"contract_id": doc["contract_id"]}, {"$unset": {"raw_text": ""}})
+            report["raw_text_deduplicated"] += 1
+            report["hot_bytes_reclaimed"] += len(doc["raw_text"].encode())
+
+    def _archive_text(self, report: dict):
+        # Reprocessed contracts have hot text again; archiving overwrites their previous blob
+        query = {"raw_extracted_data.full_text": {"$type": "string"}}
+        projection = {"_id": 0, "contract_id": 1, "raw_text": 1, "raw_extracted_data.full_text": 1}
+        for doc in self._candidates(self.text_policy, query, projection):
+            contract_id = doc["contract_id"]
+            try:
+                text = doc["raw_extracted_data"]["full_text"]
+                encoded = orjson.dumps({"full_text": text})
+                blob = gzip.compress(encoded, GZIP_LEVEL)
+                key = archive_key(contract_id, ".text.json.gz")
+                # Write the archive copy before dropping the hot one
+                storage.save(key, blob)
+                contracts_collection.update_one(
+                    {"contract_id": contract_id},
+                    {
+                        "$set": {
+                            "archive.text_key": key,
+                            "archive.text_bytes": len(encoded),
+                            "archive.text_archived_bytes": len(blob),
+                            "archive.text_archived_at": datetime.utcnow()
+                        },
+                        "$unset": {"raw_extracted_data.full_text": "", "raw_text": ""}
+                    }
+                )
+                detail_cache.invalidate(contract_id)
+            except Exception as e:
+                print(f"[ERROR] Failed to archive text of contract {contract_id}: {e}")
+                report["errors"] += 1
+                continue
+
+            report["text_archived"] += 1
+            report["hot_bytes_reclaimed"] += len(encoded) + len((doc.get("raw_text") or "").encode())
+            report["archive_bytes_written"] += len(blob)
+            self._throttle(len(encoded) + len(blob))
+
+    def _archive_pdfs(self, report: dict):
+        query = {"archive.pdf_key": {"$exists": False}, "archive.pdf_skipped_reason": {"$exists": False}, "file_path": {"$exists": True}}
+        projection = {"_id": 0, "contract_id": 1, "file_path": 1, "storage_key": 1}
+        # A file restored by a recent download stays hot for another full retention period
+        for doc in self._candidates(self.pdf_policy, query, projection, cutoff_fields=("archive.pdf_restored_at",)):
+            contract_id = doc["contract_id"]
+            try:
+                backend, key = storage_for(doc)
+                if not backend.exists(key):
+                    contracts_collection.update_one(
+                        {"contract_id": contract_id},
+                        {"$set": {"archive.pdf_skipped_reason": "file_missing", "archive.pdf_skipped_at": datetime.utcnow()}}
+                    )
+                    report["pdfs_skipped"] += 1
+                    continue
+                data = backend.read(key)
+                blob = gzip.compress(data, GZIP_LEVEL)
+                pdf_key = archive_key(contract_id, ".pdf.gz")
+                storage.save(pdf_key, blob)
+                contracts_collection.update_one(
+                    {"contract_id": contract_id},
+                    {"$set": {
+                        "archive.pdf_key": pdf_key,
+                        "archive.pdf_bytes": len(data),
+                        "archive.pdf_archived_bytes": len(blob),
+                        "archive.pdf_archived_at": datetime.utcnow()
+                    }}
+                )
+                backend.delete(key)
+            except Exception as e:
+                print(f"[ERROR] Failed to archive file of contract {contract_id}: {e}")
+                report["errors"] += 1
+                continue
+
+            report["pdfs_archived"] += 1
+            report["hot_bytes_reclaimed"] += len(data)
+            report["archive_bytes_written"] += len(blob)
+            self._throttle(len(data) + len(blob))
+
+    def run_once(self) -> dict:
+        """Run every retention pass once and return what it reclaimed."""
+        started = time.monotonic()
+        report = _empty_report()
+        report["started_at"] = datetime.utcnow()
+
+        self._dedupe_raw_text(report)
+        self._archive_text(report)
+        self._archive_pdfs(report)
+
+        report["net_bytes_reclaimed"] = report["hot_bytes_reclaimed"] - report["archive_bytes_written"]
+        report["duration_seconds"] = round(time.monotonic() - started, 2)
+        with self._lock:
+            self.last_report = report
+            for name in self.totals:
+                self.totals[name] += report[name]
+        print(
+            f"[INFO] Retention run: {report['raw_text_deduplicated']} raw_text dropped, {report['text_archived']} texts and "
+            f"{report['pdfs_archived']} files archived ({report['pdfs_skipped']} skipped), {report['net_bytes_reclaimed']} bytes reclaimed in {report['duration_seconds']}s"
+        )
+        return report
+
+    def _run_guarded(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        try:
+            self.run_once()
+        except Exception as e:
+            print(f"[ERROR] Retention run failed: {e}")
+        finally:
+            with self._lock:
+                self._running = False
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._run_guarded()
+
+    def start(self):
+        """Start the periodic background compactor (no-op when the interval is 0)."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="retention-compactor", daemon=True)
+        self._thread.start()
+
+    def trigger(self) -> bool:
+        """Start a run now in the background; returns False if one is already running."""
+        with self._lock:
+            if self._running:
+                return False
+        threading.Thread(target=self._run_guarded, name="retention-compactor-run", daemon=True).start()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self._running,
+                "interval_seconds": self.interval,
+                "text_policy_days": self.text_policy,
+                "pdf_policy_days": self.pdf_policy,
+                "max_bytes_per_second": self.max_bytes_per_second,
+                "last_run": self.last_report,
+                "totals": dict(self.totals),
+            }
+
+    def shutdown(self):
+        self._stop.set()
+
+
+retention_compactor = RetentionCompactor(
+    parse_retention_policy(RETENTION_TEXT_POLICY),
+    parse_retention_policy(RETENTION_PDF_POLICY)
+)
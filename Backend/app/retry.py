@@ -0,0 +1,110 @@
+# retry.py
+"""
+Failure classification and retry policy for contract extraction.
+
+Failures are either "transient" (database/storage connectivity, throttling, a
+crashed worker) and worth retrying, or "permanent" (unreadable PDF, missing file,
+a document that deterministically exceeds its budget). Transient failures are
+retried with exponential backoff and jitter; permanent failures and transient ones
+that run out of attempts end up in the dead-letter collection.
+"""
+import random
+import time
+from typing import Callable, Optional
+from pymongo import errors as mongo_errors
+from app.config import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+    RETRY_DB_WRITE_ATTEMPTS,
+)
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# error_type values reported by failed extraction results (see extractor / worker)
+TRANSIENT_EXTRACTION_ERRORS = {"worker_crashed", "MemoryError", "ConnectionError", "TimeoutError", "BrokenPipeError"}
+
+# Storage client errors (botocore) matched by name so boto3 stays optional
+TRANSIENT_EXCEPTION_NAMES = {"EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError", "ConnectionClosedError"}
+TRANSIENT_S3_ERROR_CODES = {"SlowDown", "Throttling", "ThrottlingException", "RequestTimeout", "InternalError", "ServiceUnavailable"}
+
+
+class ExtractionFailed(Exception):
+    """Extraction returned a failed result rather than raising."""
+
+    def __init__(self, message: str, error_type: Optional[str] = None):
+        super().__init__(message)
+        self.error_type = error_type or "ExtractionFailed"
+
+
+def error_type(exc: BaseException) -> str:
+    if isinstance(exc, ExtractionFailed):
+        return exc.error_type
+    return type(exc).__name__
+
+
+def classify_exception(exc: BaseException) -> str:
+    """Return TRANSIENT or PERMANENT for an exception raised while processing a contract."""
+    if isinstance(exc, ExtractionFailed):
+        return TRANSIENT if exc.error_type in TRANSIENT_EXTRACTION_ERRORS else PERMANENT
+
+    if isinstance(exc, mongo_errors.PyMongoError):
+        if isinstance(exc, (mongo_errors.ConnectionFailure, mongo_errors.WTimeoutError,
+                            mongo_errors.WaitQueueTimeoutError, mongo_errors.ExecutionTimeout)):
+            return TRANSIENT
+        if exc.has_error_label("RetryableWriteError") or exc.has_error_label("TransientTransactionError"):
+            return TRANSIENT
+        return PERMANENT
+
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return TRANSIENT
+    if type(exc).__name__ in TRANSIENT_EXCEPTION_NAMES:
+        return TRANSIENT
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict) and response.get("Error", {}).get("Code") in TRANSIENT_S3_ERROR_CODES:
+        return TRANSIENT
+    return PERMANENT
+
+
+class RetryPolicy:
+    """Exponential backoff with "equal jitter": attempt n waits between half and all of
+    min(max_delay, base_delay * 2**(n-1)) seconds, which spreads out retries of jobs
+    that failed together without ever retrying immediately."""
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float, multiplier: float = 2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def backoff(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def next_delay(self, kind: str, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after failed attempt number `attempt`, or None to give up."""
+        if kind != TRANSIENT or attempt >= self.max_attempts:
+            return None
+        return self.backoff(attempt)
+
+
+extraction_retry_policy = RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS)
+
+# Short, in-place retries for single database writes
+db_write_retry_policy = RetryPolicy(RETRY_DB_WRITE_ATTEMPTS, 0.2, 2.0)
+
+
+def call_with_retry(fn: Callable, policy: RetryPolicy = db_write_retry_policy, description: str = "operation"):
+    """Call `fn`, retrying transient failures in place; the last error is re-raised."""
+    attempt = 1
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            delay = policy.next_delay(classify_exception(e), attempt)
+            if delay is None:
+                raise
+            print(f"[WARNING] {description} failed (attempt {attempt}/{policy.max_attempts}), retrying in {delay:.2f}s: {e}")
+            time.sleep(delay)
+            attempt += 1
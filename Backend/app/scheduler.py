@@ -0,0 +1,223 @@
+# scheduler.py
+"""
+Shortest-job-first, fair-share scheduler for contract extraction.
+
+Every upload is queued with a priority class and an estimated cost (pages, read
+cheaply from the PDF). Dispatch picks, in order:
+  1. the most urgent priority class waiting,
+  2. the client that has consumed the least weighted cost so far (fair share),
+  3. that client's cheapest job, with waiting time credited against cost so
+     large jobs are not starved.
+While other clients have work queued, a client may have at most
+SCHEDULER_MAX_RUNNING_PER_CLIENT jobs running; with no one else waiting it can
+use every slot.
+Retries are submitted with a delay and join the queue once it has elapsed.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Optional
+from app.config import (
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_MAX_RUNNING_PER_CLIENT,
+    SCHEDULER_AGING_PAGES_PER_SECOND,
+)
+from app.utils import pdf_page_count_hint
+
+PRIORITY_CLASSES = {"high": 0, "normal": 1, "bulk": 2}
+
+# Used to estimate page count when it cannot be read from the PDF
+BYTES_PER_PAGE_ESTIMATE = 50 * 1024
+
+
+def estimate_cost(contents: bytes) -> dict:
+    """Estimate extraction cost from the raw upload, in pages."""
+    pages = pdf_page_count_hint(contents)
+    if pages is not None:
+        cost = float(max(pages, 1))
+    else:
+        cost = max(len(contents) / BYTES_PER_PAGE_ESTIMATE, 1.0)
+    return {"estimated_pages": pages, "file_size": len(contents), "estimated_cost": round(cost, 2)}
+
+
+def parse_client_weights(value: str) -> dict:
+    weights = {}
+    for item in value.split(","):
+        client_id, sep, weight = item.strip().rpartition("=")
+        if sep and client_id:
+            try:
+                weights[client_id] = max(float(weight), 0.01)
+            except ValueError:
+                print(f"[WARNING] Ignoring invalid scheduler weight: {item}")
+    return weights
+
+
+class ExtractionJob:
+    def __init__(self, contract_id: str, file_path: str, storage_key: Optional[str], client_id: str, priority: str, cost: float, attempt: int = 1):
+        self.contract_id = contract_id
+        self.file_path = file_path
+        self.storage_key = storage_key
+        self.client_id = client_id
+        self.priority = priority
+        self.cost = cost
+        self.attempt = attempt
+        self.enqueued_at = time.monotonic()
+    
+    def next_attempt(self) -> "ExtractionJob":
+        return ExtractionJob(self.contract_id, self.file_path, self.storage_key, self.client_id, self.priority, self.cost, self.attempt + 1)
+
+
+class ExtractionScheduler:
+    def __init__(
+        self,
+        run_job: Callable[[ExtractionJob], None],
+        concurrency: int = SCHEDULER_CONCURRENCY,
+        max_running_per_client: int = SCHEDULER_MAX_RUNNING_PER_CLIENT,
+        aging_rate: float = SCHEDULER_AGING_PAGES_PER_SECOND,
+        weights: Optional[dict] = None,
+    ):
+        self.run_job = run_job
+        self.concurrency = concurrency
+        self.max_running_per_client = max_running_per_client
+        self.aging_rate = aging_rate
+        self.weights = weights or {}
+        self._cond = threading.Condition()
+        self._queues = {}   # client_id -> heap of (sort_key, seq, job)
+        self._running = {}  # client_id -> jobs running
+        self._usage = {}    # client_id -> weighted cost dispatched (virtual time)
+        self._delayed = []  # heap of (ready_at, seq, job) waiting out a retry backoff
+        self._seq = itertools.count()
+        self._threads = []
+        self._stopping = False
+        self.completed = 0
+    
+    def _sort_key(self, job: ExtractionJob) -> tuple:
+        # cost - aging_rate * (now - enqueued_at) orders jobs the same way at any `now`
+        return (PRIORITY_CLASSES[job.priority], job.cost + self.aging_rate * job.enqueued_at)
+    
+    def _is_active(self, client_id: str) -> bool:
+        return bool(self._queues.get(client_id)) or self._running.get(client_id, 0) > 0
+    
+    def submit(self, job: ExtractionJob, delay: float = 0):
+        """Queue a job, after `delay` seconds if given, and start the dispatcher threads on first use."""
+        with self._cond:
+            if delay > 0:
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), job))
+            else:
+                self._enqueue(job)
+            self._ensure_started()
+            self._cond.notify()
+    
+    def _enqueue(self, job: ExtractionJob):
+        # Caller must hold the lock
+        if not self._is_active(job.client_id):
+            # A returning client starts at the current virtual time rather than
+            # cashing in credit accumulated while it was idle
+            active = [self._usage.get(c, 0.0) for c in self._usage if self._is_active(c)]
+            floor = min(active) if active else 0.0
+            self._usage[job.client_id] = max(self._usage.get(job.client_id, 0.0), floor)
+        heapq.heappush(self._queues.setdefault(job.client_id, []), (self._sort_key(job), next(self._seq), job))
+    
+    def _promote_delayed(self) -> Optional[float]:
+        """Queue delayed jobs that are due; returns seconds until the next one, if any. Caller must hold the lock."""
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, job = heapq.heappop(self._delayed)
+            job.enqueued_at = now
+            self._enqueue(job)
+        return self._delayed[0][0] - now if self._delayed else None
+    
+    def _select(self) -> Optional[ExtractionJob]:
+        # Caller must hold the lock
+        waiting = [client_id for client_id, heap in self._queues.items() if heap]
+        under_cap = [c for c in waiting if self._running.get(c, 0) < self.max_running_per_client]
+        # The cap only holds a client back while someone under it is waiting; otherwise
+        # a free slot would sit idle
+        best = None
+        for client_id in under_cap or waiting:
+            heap = self._queues[client_id]
+            (priority, key), seq, _ = heap[0]
+            candidate = (priority, self._usage.get(client_id, 0.0), key, seq, client_id)
+            if best is None or candidate < best:
+                best = candidate
+        if best is None:
+            return None
+        
+        client_id = best[-1]
+        _, _, job = heapq.heappop(self._queues[client_id])
+        if not self._queues[client_id]:
+            del self._queues[client_id]
+        self._running[client_id] = self._running.get(client_id, 0) + 1
+        self._usage[client_id] = self._usage.get(client_id, 0.0) + job.cost / self.weights.get(client_id, 1.0)
+        return job
+    
+    def _next_job(self) -> Optional[ExtractionJob]:
+        with self._cond:
+            while not self._stopping:
+                next_due = self._promote_delayed()
+                job = self._select()
+                if job is not None:
+                    return job
+                self._cond.wait(next_due)
+            return None
+    
+    def _finish(self, job: ExtractionJob):
+        with self._cond:
+            self._running[job.client_id] -= 1
+            if not self._running[job.client_id]:
+                del self._running[job.client_id]
+            self.completed += 1
+            self._cond.notify_all()
+    
+    def _dispatch_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            waited = time.monotonic() - job.enqueued_at
+            print(f"[INFO] Dispatching contract {job.contract_id} (client {job.client_id}, {job.priority}, cost {job.cost}) after {waited:.1f}s")
+            try:
+                self.run_job(job)
+            except Exception as e:
+                print(f"[ERROR] Scheduled job for contract {job.contract_id} raised: {e}")
+            finally:
+                self._finish(job)
+    
+    def _ensure_started(self):
+        # Caller must hold the lock
+        if self._threads or self._stopping:
+            return
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._dispatch_loop, name=f"extraction-dispatch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "concurrency": self.concurrency,
+                "max_running_per_client": self.max_running_per_client,
+                "queued": sum(len(heap) for heap in self._queues.values()),
+                "delayed": len(self._delayed),
+                "running": sum(self._running.values()),
+                "completed": self.completed,
+                "clients": {
+                    client_id: {
+                        "queued": len(self._queues.get(client_id, [])),
+                        "running": self._running.get(client_id, 0),
+                        "usage": round(self._usage.get(client_id, 0.0), 2),
+                        "weight": self.weights.get(client_id, 1.0),
+                    }
+                    for client_id in set(self._queues) | set(self._running)
+                },
+            }
+    
+    def shutdown(self, timeout: float = 5):
+        """Stop dispatching; queued and delayed jobs are dropped, stay `pending` / `retrying` in
+        the database and are resubmitted on the next startup (see background.resume_unfinished_jobs)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
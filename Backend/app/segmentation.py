@@ -0,0 +1,183 @@
+# segmentation.py
+"""
+Splits contract text into pages and heading-delimited sections with character offsets.
+
+The resulting section index is stored per contract. Extraction rules use it to
+search only the sections relevant to them, and the UI can use it to highlight
+where a value came from.
+"""
+import bisect
+import re
+
+# Lines that open a new section or clause: "Section 4", "ARTICLE II", "3.", "3.2 Fees", "IV. Term".
+# Numbered lines only count when the rest reads like a heading (see _is_heading_title),
+# so wrapped body lines such as "30 days after notice ..." stay in their section.
+_LABEL_RE = re.compile(
+    r"^(?:section|article|clause|schedule|exhibit|appendix|annex)\s+[\w.]+[:.)]?(?:\s+(?P<title>.*))?$",
+    re.IGNORECASE
+)
+_NUMBER_RE = re.compile(r"^(?P<marker>\d+(?:\.\d+)*[.)]?|[IVXLC]+[.)])\s+(?P<title>[A-Za-z].*)$")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'&-]*")
+
+# Words left lowercase in title-case headings; a line ending in one continues a sentence
+_SMALL_WORDS = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+_MAX_HEADING_CHARS = 80
+
+
+def _keyword_pattern(keywords: tuple) -> re.Pattern:
+    # Whole words only, with an optional plural: "sla" must not match "legislation",
+    # nor "party" match "third-party"
+    parts = []
+    for keyword in keywords:
+        part = re.escape(keyword)
+        if keyword[0].isalnum():
+            part = r"(?<![\w-])" + part
+        if keyword[-1].isalnum():
+            part += r"s?(?![\w-])"
+        parts.append(part)
+    return re.compile("|".join(parts))
+
+
+# Section kinds, checked in order against the heading first and then the start of the body
+SECTION_KEYWORDS = [
+    (kind, _keyword_pattern(keywords))
+    for kind, keywords in [
+        ("sla", ("service level", "sla", "uptime", "availability", "response time", "support")),
+        ("payment", ("payment", "invoice", "billing", "fees", "price", "pricing", "compensation", "charges")),
+        ("term", ("term", "renewal", "termination", "duration")),
+        ("signatures", ("signature", "signed", "in witness", "authorized", "executed")),
+        ("parties", ("parties", "party", "between")),
+        ("financial", ("amount", "total", "cost", "$", "usd")),
+    ]
+]
+
+# Which section kinds each extraction rule (see extractor.extract_fields) is routed to.
+# Rules not listed here always search the whole document.
+RULE_SECTIONS = {
+    "parties": {"preamble", "parties"},
+    "registration": {"preamble", "parties", "signatures"},
+    "signatories": {"signatures", "parties"},
+    "amounts": {"payment", "financial"},
+    "line_items": {"payment", "financial"},
+    "payment_terms": {"payment"},
+    "schedules": {"payment", "financial"},
+    "billing_cycles": {"payment", "financial", "term"},
+    "sla": {"sla"},
+}
+
+MAX_SECTIONS = 2000
+HEADING_PREVIEW_CHARS = 80
+_BODY_PREVIEW_CHARS = 300
+
+
+def _is_heading_title(title: str, delimited: bool) -> bool:
+    """Whether the text after a section number reads like a heading rather than prose."""
+    title = title.strip()
+    if not title:
+        return True
+    if len(title) > _MAX_HEADING_CHARS or title[-1] in ",;-":
+        return False
+    words = _WORD_RE.findall(title)
+    if words and words[-1].lower() in _SMALL_WORDS:
+        return False
+    if all(word[0].isupper() for word in words if word.lower() not in _SMALL_WORDS):
+        return True
+    # A one-sentence heading after "3." / "3)": "3. Term of this agreement."
+    return delimited and title.endswith(".") and "." not in title[:-1]
+
+
+def _is_boundary(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped:
+        return False
+    match = _LABEL_RE.match(stripped)
+    if match:
+        return _is_heading_title(match.group("title") or "", True)
+    match = _NUMBER_RE.match(stripped)
+    if match:
+        return _is_heading_title(match.group("title"), match.group("marker")[-1] in ".)")
+    # Short ALL-CAPS lines are headings ("PAYMENT TERMS")
+    letters = [c for c in stripped if c.isalpha()]
+    return len(letters) >= 3 and len(stripped) <= 100 and all(c.isupper() for c in letters)
+
+
+def classify_section(heading: str, body: str) -> str:
+    heading = heading.lower()
+    for kind, pattern in SECTION_KEYWORDS:
+        if pattern.search(heading):
+            return kind
+    body = body[:_BODY_PREVIEW_CHARS].lower()
+    for kind, pattern in SECTION_KEYWORDS:
+        if pattern.search(body):
+            return kind
+    return "general"
+
+
+def page_for_offset(page_offsets: list, offset: int) -> int:
+    """1-based page number containing a character offset."""
+    if not page_offsets:
+        return 1
+    return max(bisect.bisect_right(page_offsets, offset), 1)
+
+
+def segment_text(text: str, page_offsets: list = None) -> dict:
+    """Build the section index for a document.
+
+    Returns {"pages": [page start offsets], "sections": [{"start", "end", "page", "kind", "heading"}]}.
+    Text before the first heading is the "preamble" section.
+    """
+    page_offsets = page_offsets or [0]
+    boundaries = [0]
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        if offset and _is_boundary(line):
+            boundaries.append(offset)
+        offset += len(line)
+    boundaries.append(len(text))
+    
+    sections = []
+    for i, (start, end) in enumerate(zip(boundaries, boundaries[1:])):
+        if end <= start:
+            continue
+        chunk = text[start:end]
+        first_line = chunk.lstrip().split("\n", 1)[0].strip()
+        if i == 0 and not _is_boundary(first_line):
+            kind, heading = "preamble", ""
+        else:
+            heading = first_line[:HEADING_PREVIEW_CHARS]
+            kind = classify_section(heading, chunk[len(first_line):])
+        sections.append({
+            "start": start,
+            "end": end,
+            "page": page_for_offset(page_offsets, start),
+            "kind": kind,
+            "heading": heading
+        })
+    
+    # Keep the index compact: merge the tail into one section on pathological documents
+    if len(sections) > MAX_SECTIONS:
+        tail = sections[MAX_SECTIONS - 1:]
+        sections = sections[:MAX_SECTIONS - 1] + [dict(tail[0], end=tail[-1]["end"], kind="general")]
+    
+    return {"pages": list(page_offsets), "sections": sections}
+
+
+def build_routes(section_index: dict) -> dict:
+    """Map each routed rule to the [start, end] windows of its relevant sections.
+
+    Rules whose section kinds are absent from the document are left out, so they
+    search the whole text.
+    """
+    routes = {}
+    for rule, kinds in RULE_SECTIONS.items():
+        windows = []
+        for section in section_index.get("sections", []):
+            if section["kind"] not in kinds:
+                continue
+            if windows and windows[-1][1] == section["start"]:
+                windows[-1][1] = section["end"]
+            else:
+                windows.append([section["start"], section["end"]])
+        if windows:
+            routes[rule] = windows
+    return routes
@@ -0,0 +1,292 @@
+# storage.py
+"""
+Pluggable storage backends for uploaded contract files.
+
+Files are placed in hash-sharded subdirectories (`ab/cd/<contract_id>.pdf`, where
+`abcd...` is the SHA-256 of the file content) so no single directory grows unbounded.
+"""
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from app.config import UPLOAD_DIR, STORAGE_BACKEND, S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 hex digest of file content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def shard_key(digest: str, filename: str) -> str:
+    """Storage key for a file, sharded two levels deep by its content hash."""
+    return f"{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Write through a uniquely named temp file so readers never see a partial file
+    and concurrent writers of the same key never share one."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp = tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False)
+    try:
+        with tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+    except BaseException:
+        _remove_if_exists(tmp.name)
+        raise
+
+
+def _remove_if_exists(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class StorageBackend:
+    """Interface implemented by every storage backend. Keys are '/'-separated relative paths."""
+    
+    def save(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+    
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+    
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+    
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+    
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield bytes start..end (inclusive) of the stored file."""
+        raise NotImplementedError
+    
+    def read(self, key: str) -> bytes:
+        """Whole content of a stored file."""
+        size = self.size(key)
+        return b"".join(self.iter_range(key, 0, size - 1)) if size else b""
+    
+    def locator(self, key: str) -> str:
+        """Human-readable location of a stored file (stored as `file_path`)."""
+        raise NotImplementedError
+    
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of the file if it is directly readable, else None."""
+        return None
+    
+    @contextmanager
+    def local_copy(self, key: str):
+        """Yield a local filesystem path for the file, downloading it to a temp file if needed."""
+        path = self.local_path(key)
+        if path is not None:
+            yield path
+            return
+        
+        fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        try:
+            with os.fdopen(fd, "wb") as f:
+                size = self.size(key)
+                if size:
+                    for chunk in self.iter_range(key, 0, size - 1):
+                        f.write(chunk)
+            yield tmp_path
+        finally:
+            os.remove(tmp_path)
+
+
+class LocalStorage(StorageBackend):
+    """Stores files on the local filesystem under `root`."""
+    
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+    
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, *key.split("/")))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+    
+    def save(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        _atomic_write(path, data)
+    
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+    
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+    
+    def delete(self, key: str) -> None:
+        _remove_if_exists(self._path(key))
+    
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    def locator(self, key: str) -> str:
+        return self._path(key)
+    
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+def _is_not_found(error: Exception) -> bool:
+    if isinstance(error, FileNotFoundError):
+        return True
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3Storage(StorageBackend):
+    """Stores files in an S3-compatible bucket.
+
+    `client` must provide the boto3 S3 client methods put_object, head_object,
+    get_object (with Range) and delete_object, e.g. `boto3.client("s3")` or LocalS3Client.
+    """
+    
+    def __init__(self, client, bucket: str, prefix: str = ""):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+    
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+    
+    def save(self, key: str, data: bytes) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=data,
+            ContentType="application/pdf"
+        )
+    
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            if _is_not_found(e):
+                return False
+            raise
+    
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))["ContentLength"]
+    
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+    
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Range=f"bytes={start}-{end}"
+        )
+        body = response["Body"]
+        try:
+            while True:
+                chunk = body.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+    
+    def locator(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+
+class _RangeReader:
+    """File-like object returned as `Body` by LocalS3Client.get_object."""
+    
+    def __init__(self, path: str, start: int, length: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = length
+    
+    def read(self, amt: Optional[int] = None) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        amt = self._remaining if amt is None else min(amt, self._remaining)
+        data = self._file.read(amt)
+        self._remaining -= len(data)
+        return data
+    
+    def close(self):
+        self._file.close()
+
+
+class LocalS3Client:
+    """Local stand-in for the subset of the boto3 S3 client used by S3Storage.
+
+    Objects are stored as files under `root/<bucket>/<key>`.
+    """
+    
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+    
+    def _path(self, bucket: str, key: str) -> str:
+        base = os.path.join(self.root, bucket)
+        path = os.path.abspath(os.path.join(base, *key.split("/")))
+        if os.path.commonpath([os.path.abspath(base), path]) != os.path.abspath(base):
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+    
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs):
+        path = self._path(Bucket, Key)
+        _atomic_write(path, Body)
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+    
+    def head_object(self, Bucket: str, Key: str):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"s3://{Bucket}/{Key}")
+        return {"ContentLength": os.path.getsize(path)}
+    
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None):
+        size = self.head_object(Bucket=Bucket, Key=Key)["ContentLength"]
+        start, end = 0, size - 1
+        if Range:
+            first, last = Range.replace("bytes=", "").split("-")
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        length = max(end - start + 1, 0)
+        return {"Body": _RangeReader(self._path(Bucket, Key), start, length), "ContentLength": length}
+    
+    def delete_object(self, Bucket: str, Key: str):
+        _remove_if_exists(self._path(Bucket, Key))
+        return {}
+
+
+def create_storage() -> StorageBackend:
+    """Create the storage backend selected by STORAGE_BACKEND (local, s3 or s3-local)."""
+    if STORAGE_BACKEND == "s3":
+        import boto3  # only needed for the real S3 backend
+        return S3Storage(boto3.client("s3", endpoint_url=S3_ENDPOINT_URL), S3_BUCKET, S3_PREFIX)
+    if STORAGE_BACKEND == "s3-local":
+        return S3Storage(LocalS3Client(UPLOAD_DIR), S3_BUCKET, S3_PREFIX)
+    return LocalStorage(UPLOAD_DIR)
+
+
+def storage_for(doc: dict):
+    """Return (backend, key) for a contract document.
+
+    Contracts uploaded before sharded storage only have a flat `file_path`.
+    """
+    if doc.get("storage_key"):
+        return storage, doc["storage_key"]
+    file_path = doc["file_path"]
+    return LocalStorage(os.path.dirname(file_path)), os.path.basename(file_path)
+
+
+storage = create_storage()
@@ -0,0 +1,109 @@
+# templates.py
+"""
+LSH index of completed contracts, used to find the template a contract was generated from.
+
+Each completed contract is stored in `contract_fingerprints` with its MinHash signature
+and LSH band keys (multikey-indexed, so candidate lookup is sub-linear). A contract
+that matches no existing template becomes a template itself and keeps the locations
+of its regex matches, which later matches are compared against to report
+missing or added fields.
+"""
+from datetime import datetime
+from typing import Optional
+from app.db import fingerprints_collection
+from app.config import TEMPLATE_MATCH_THRESHOLD, LSH_MAX_CANDIDATES
+from app.fingerprint import band_keys, estimate_similarity
+
+
+def ensure_indexes():
+    fingerprints_collection.create_index("contract_id", unique=True)
+    fingerprints_collection.create_index("bands")
+    fingerprints_collection.create_index("template_id")
+
+
+def _candidates(signature: list, query: dict, projection: dict):
+    """Fingerprints sharing at least one LSH band with `signature`, ranked by similarity."""
+    query = dict(query, bands={"$in": band_keys(signature)})
+    ranked = []
+    for doc in fingerprints_collection.find(query, projection).limit(LSH_MAX_CANDIDATES):
+        ranked.append((estimate_similarity(signature, doc["signature"]), doc))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked
+
+
+def find_template(signature: list, exclude_contract_id: Optional[str] = None) -> Optional[dict]:
+    """Return the nearest template above TEMPLATE_MATCH_THRESHOLD, or None.
+
+    `exclude_contract_id` keeps a reprocessed template from matching itself.
+    """
+    query = {"is_template": True}
+    if exclude_contract_id:
+        query["contract_id"] = {"$ne": exclude_contract_id}
+    ranked = _candidates(
+        signature,
+        query,
+        {"_id": 0, "contract_id": 1, "signature": 1, "rule_locations": 1, "text_length": 1}
+    )
+    if not ranked or ranked[0][0] < TEMPLATE_MATCH_THRESHOLD:
+        return None
+    similarity, doc = ranked[0]
+    return {
+        "template_id": doc["contract_id"],
+        "similarity": round(similarity, 4),
+        "rule_locations": doc.get("rule_locations", {}),
+        "text_length": doc.get("text_length", 0)
+    }
+
+
+def register_fingerprint(contract_id: str, fingerprint: dict, template_match: Optional[dict]):
+    """Add a completed contract to the index, as a template or as a member of one.
+
+    A contract that is already a template stays one when it is reprocessed, so the
+    contracts matched against it keep a valid template_id.
+    """
+    existing = fingerprints_collection.find_one({"contract_id": contract_id}, {"_id": 0, "is_template": 1})
+    is_template = template_match is None or bool(existing and existing.get("is_template"))
+    doc = {
+        "contract_id": contract_id,
+        "signature": fingerprint["signature"],
+        "bands": band_keys(fingerprint["signature"]),
+        "text_length": fingerprint.get("text_length", 0),
+        "is_template": is_template,
+        "template_id": contract_id if is_template else template_match["template_id"],
+        "similarity": 1.0 if is_template else template_match["similarity"],
+        "updated_at": datetime.utcnow()
+    }
+    if is_template:
+        doc["rule_locations"] = fingerprint.get("rule_locations", {})
+    fingerprints_collection.replace_one({"contract_id": contract_id}, doc, upsert=True)
+    return doc["template_id"]
+
+
+def find_similar(contract_id: str, threshold: float = TEMPLATE_MATCH_THRESHOLD, limit: int = 20) -> Optional[dict]:
+    """Near-duplicates of a contract plus the size of its template cluster."""
+    doc = fingerprints_collection.find_one(
+        {"contract_id": contract_id},
+        {"_id": 0, "signature": 1, "template_id": 1, "is_template": 1, "similarity": 1}
+    )
+    if not doc:
+        return None
+    
+    ranked = _candidates(
+        doc["signature"],
+        {"contract_id": {"$ne": contract_id}},
+        {"_id": 0, "contract_id": 1, "signature": 1, "template_id": 1}
+    )
+    near_duplicates = [
+        {"contract_id": other["contract_id"], "similarity": round(similarity, 4), "template_id": other["template_id"]}
+        for similarity, other in ranked
+        if similarity >= threshold
+    ][:limit]
+    
+    return {
+        "contract_id": contract_id,
+        "template_id": doc["template_id"],
+        "is_template": doc["is_template"],
+        "template_similarity": doc.get("similarity"),
+        "cluster_size": fingerprints_collection.count_documents({"template_id": doc["template_id"]}),
+        "near_duplicates": near_duplicates
+    }
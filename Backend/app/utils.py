@@ -1,4 +1,5 @@
 # utils.py
+import re
 import pdfplumber
 
 def extract_text_from_pdf(pdf_path: str) -> str:
@@ -8,3 +9,130 @@ def extract_text_from_pdf(pdf_path: str) -> str:
         for page in pdf.pages:
             text += page.extract_text() or ""
     return text
+
+_ROOT_REF_RE = re.compile(rb"/Root\s+(\d+)\s+(\d+)\s+R")
+_PAGES_REF_RE = re.compile(rb"/Pages\s+(\d+)\s+(\d+)\s+R")
+_PREV_RE = re.compile(rb"/Prev\s+(\d+)")
+_COUNT_RE = re.compile(rb"/Count\s+(\d+)(?!\s+\d+\s+R)")
+_PAGE_TYPE_RE = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)")
+_XREF_RE = re.compile(rb"\s*xref")
+_XREF_SUBSECTION_RE = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*(?:\r\n|\r|\n)")
+_XREF_ENTRY_RE = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_TRAILER_RE = re.compile(rb"\s*trailer\s*<<")
+_OBJECT_RE = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\b")
+
+# Bytes read around the file end for startxref, per trailer dictionary and per object
+_TAIL_BYTES = 2048
+_TRAILER_BYTES = 4096
+_MAX_OBJECT_BYTES = 1024 * 1024
+_MAX_XREF_SECTIONS = 32
+# Without a usable cross-reference table, only this much of each end of the file is scanned
+_SCAN_BYTES = 1024 * 1024
+# Each classic cross-reference entry is exactly 20 bytes
+_XREF_ENTRY_BYTES = 20
+
+def _read_xref(data: bytes):
+    """Follow startxref through a classic cross-reference table and its /Prev chain.
+
+    Returns (root reference match, sections newest first, each a list of
+    (first object number, count, entries offset)), or None for cross-reference
+    streams and anything malformed.
+    """
+    startxref = None
+    for startxref in _STARTXREF_RE.finditer(data, max(len(data) - _TAIL_BYTES, 0)):
+        pass
+    if startxref is None:
+        return None
+    
+    root, sections, seen = None, [], set()
+    offset = int(startxref.group(1))
+    while offset is not None and offset not in seen and len(sections) < _MAX_XREF_SECTIONS:
+        seen.add(offset)
+        xref = _XREF_RE.match(data, offset)
+        if not xref:
+            return None
+        subsections, pos = [], xref.end()
+        while True:
+            header = _XREF_SUBSECTION_RE.match(data, pos)
+            if not header:
+                break
+            first, count = int(header.group(1)), int(header.group(2))
+            subsections.append((first, count, header.end()))
+            pos = header.end() + count * _XREF_ENTRY_BYTES
+        trailer = _TRAILER_RE.match(data, pos)
+        if not trailer:
+            return None
+        end = data.find(b"startxref", trailer.end(), trailer.end() + _TRAILER_BYTES)
+        end = end if end != -1 else trailer.end() + _TRAILER_BYTES
+        root = root or _ROOT_REF_RE.search(data, trailer.end(), end)
+        prev = _PREV_RE.search(data, trailer.end(), end)
+        sections.append(subsections)
+        offset = int(prev.group(1)) if prev else None
+    return (root, sections) if root else None
+
+def _xref_object(data: bytes, sections: list, num: int):
+    """Body of object `num`, located through the cross-reference table."""
+    for subsections in sections:
+        for first, count, entries in subsections:
+            if not first <= num < first + count:
+                continue
+            entry = _XREF_ENTRY_RE.match(data, entries + (num - first) * _XREF_ENTRY_BYTES)
+            if not entry or entry.group(3) != b"n":
+                return None
+            header = _OBJECT_RE.match(data, int(entry.group(1)))
+            if not header or int(header.group(1)) != num:
+                return None
+            end = data.find(b"endobj", header.end(), header.end() + _MAX_OBJECT_BYTES)
+            return data[header.end():end] if end != -1 else None
+    return None
+
+def _pdf_object(data: bytes, num: bytes, gen: bytes, windows: list):
+    """Return the body of the last (most recent) definition of an uncompressed PDF object within `windows`."""
+    body = None
+    pattern = re.compile(rb"(?<!\d)" + num + rb"\s+" + gen + rb"\s+obj\b")
+    for start, end in windows:
+        for match in pattern.finditer(data, start, end):
+            stop = data.find(b"endobj", match.end(), end)
+            body = data[match.end():stop if stop != -1 else end]
+    return body
+
+def _page_count(catalog, lookup):
+    pages_ref = _PAGES_REF_RE.search(catalog) if catalog else None
+    if pages_ref:
+        pages = lookup(pages_ref)
+        count = _COUNT_RE.search(pages) if pages else None
+        if count:
+            return int(count.group(1))
+    return None
+
+def pdf_page_count_hint(data: bytes):
+    """Cheaply read a PDF's page count without parsing it.
+
+    Follows startxref to the cross-reference table and seeks straight to the
+    catalog (/Root) and page tree for its /Count. When there is no classic table
+    (cross-reference streams, damaged files) only the first and last _SCAN_BYTES
+    are scanned. Returns None when the count cannot be found that way.
+    """
+    xref = _read_xref(data)
+    if xref is not None:
+        root, sections = xref
+        catalog = _xref_object(data, sections, int(root.group(1)))
+        count = _page_count(catalog, lambda ref: _xref_object(data, sections, int(ref.group(1))))
+        if count is not None:
+            return count
+    
+    whole_file = len(data) <= 2 * _SCAN_BYTES
+    windows = [(0, len(data))] if whole_file else [(0, _SCAN_BYTES), (len(data) - _SCAN_BYTES, len(data))]
+    # The trailer (or cross-reference stream dictionary) sits at the end of the file
+    roots = _ROOT_REF_RE.findall(data, windows[-1][0])
+    if roots:
+        catalog = _pdf_object(data, *roots[-1], windows)
+        count = _page_count(catalog, lambda ref: _pdf_object(data, *ref.groups(), windows))
+        if count is not None:
+            return count
+    
+    # Counting page objects is only meaningful when the whole file was scanned
+    if whole_file:
+        return len(_PAGE_TYPE_RE.findall(data)) or None
+    return None
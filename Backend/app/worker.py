@@ -0,0 +1,270 @@
+# worker.py
+"""
+Isolated extraction worker processes with per-document budgets.
+
+Each worker is a long-lived child process that runs `extractor.process_contract`.
+Stage outputs are sent back to the parent as they complete, so when a document
+overruns its hard time limit or the worker exceeds its memory limit, the parent
+kills and replaces the worker and still returns a partial result marked `truncated`.
+A worker that crashes is replaced too, and the document fails as `worker_crashed`,
+which the retry policy treats as transient.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Optional
+from app.config import (
+    EXTRACTION_WORKERS,
+    EXTRACTION_MAX_PAGES,
+    EXTRACTION_MAX_NER_CHARS,
+    EXTRACTION_MAX_REGEX_CHARS,
+    EXTRACTION_TEXT_SECONDS,
+    EXTRACTION_NER_SECONDS,
+    EXTRACTION_DOCUMENT_SECONDS,
+    EXTRACTION_HARD_TIMEOUT_GRACE_SECONDS,
+    EXTRACTION_WORKER_MAX_RSS_MB,
+)
+
+# How often the parent checks a busy worker's wall time and memory
+WATCHDOG_INTERVAL_SECONDS = 0.5
+
+
+def default_budget() -> dict:
+    """Per-document budget from configuration; limits set to 0 are disabled."""
+    budget = {
+        "max_pages": EXTRACTION_MAX_PAGES,
+        "max_ner_chars": EXTRACTION_MAX_NER_CHARS,
+        "max_regex_chars": EXTRACTION_MAX_REGEX_CHARS,
+        "text_seconds": EXTRACTION_TEXT_SECONDS,
+        "ner_seconds": EXTRACTION_NER_SECONDS,
+        "document_seconds": EXTRACTION_DOCUMENT_SECONDS,
+    }
+    return {key: value for key, value in budget.items() if value}
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def partial_result(pdf_path: str, stages: dict, reason: str) -> dict:
+    """Assemble a result from the stages a killed worker managed to report.
+
+    Budget overruns complete as `truncated`; a crashed worker or nothing usable fails.
+    """
+    from app.extractor import new_result, finalize_result
+    
+    result = new_result(pdf_path)
+    text_stage = stages.get("text")
+    # A crash says nothing about the document, so it fails (and is retried) rather
+    # than completing from whatever stages got through
+    if text_stage is None or reason == "worker_crashed":
+        stage = "text extraction" if text_stage is None else "extraction"
+        result["processing_status"] = "failed"
+        result["error"] = f"Extraction aborted during {stage} ({reason})"
+        result["error_type"] = reason
+        result["truncated"] = True
+        result["truncation_reasons"] = [reason]
+        return result
+    
+    latest = stages.get("entities") or stages.get("fields") or text_stage
+    truncation = latest.get("truncation", []) + [reason]
+    entities = stages.get("entities", {}).get("entities")
+    fields = stages.get("fields", {}).get("fields")
+    return finalize_result(result, text_stage["text"], entities, fields, truncation, text_stage["text_stats"])
+
+
+def _notify(on_stage, stage: str, payload: dict):
+    """Deliver a stage result; a failing callback must not abort the extraction."""
+    if on_stage is None:
+        return
+    try:
+        on_stage(stage, payload)
+    except Exception as e:
+        print(f"[ERROR] Failed to publish {stage} stage: {e}")
+
+
+def _call(callback, argument):
+    """Run a parent-side lookup for the worker; failures degrade to "no answer"."""
+    try:
+        return callback(argument)
+    except Exception as e:
+        print(f"[ERROR] Worker request failed: {e}")
+        return None
+
+
+def _worker_main(conn):
+    """Child process loop: run one extraction job per message until told to stop."""
+    from app.extractor import process_contract
+    
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        pdf_path, budget, use_templates = job
+        
+        def template_lookup(signature):
+            # The template index lives in the parent, which owns the database connection
+            conn.send(("request", "template_lookup", signature))
+            return conn.recv()
+        
+        result = process_contract(
+            pdf_path,
+            budget=budget,
+            on_stage=lambda stage, payload: conn.send(("stage", stage, payload)),
+            template_lookup=template_lookup if use_templates else None
+        )
+        conn.send(("result", result))
+
+
+class ExtractionWorker:
+    """A single extraction child process plus the parent-side watchdog."""
+    
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self.process = None
+        self.conn = None
+        self.start()
+    
+    def start(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        self.process = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+    
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+    
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+    
+    def recycle(self, reason: str):
+        print(f"[WARNING] Recycling extraction worker {self.process.pid}: {reason}")
+        self.kill()
+        self.start()
+    
+    def run(self, pdf_path: str, budget: dict, on_stage=None, template_lookup=None) -> dict:
+        if not self.process.is_alive():
+            self.recycle("worker_crashed")
+        self.conn.send((pdf_path, budget, template_lookup is not None))
+        
+        document_seconds = budget.get("document_seconds")
+        hard_timeout = document_seconds + EXTRACTION_HARD_TIMEOUT_GRACE_SECONDS if document_seconds else None
+        started = time.monotonic()
+        stages = {}
+        
+        while True:
+            reason = message = None
+            try:
+                if self.conn.poll(WATCHDOG_INTERVAL_SECONDS):
+                    message = self.conn.recv()
+                    if message[0] == "request":
+                        self.conn.send(_call(template_lookup, message[2]))
+                        continue
+            except (EOFError, OSError):
+                # The pipe broke (e.g. ECONNRESET when the child died mid-message)
+                reason = "worker_crashed"
+            
+            if message is not None:
+                if message[0] == "result":
+                    break
+                stages[message[1]] = message[2]
+                _notify(on_stage, message[1], message[2])
+            
+            if reason is None:
+                if not self.process.is_alive():
+                    reason = "worker_crashed"
+                elif hard_timeout and time.monotonic() - started > hard_timeout:
+                    reason = "document_timeout"
+                elif EXTRACTION_WORKER_MAX_RSS_MB:
+                    rss = rss_mb(self.process.pid)
+                    if rss is not None and rss > EXTRACTION_WORKER_MAX_RSS_MB:
+                        reason = "memory_limit"
+            
+            if reason is not None:
+                self.recycle(reason)
+                return partial_result(pdf_path, stages, reason)
+        
+        # Memory is not returned to the OS reliably, so recycle workers that grew too large
+        if EXTRACTION_WORKER_MAX_RSS_MB:
+            rss = rss_mb(self.process.pid)
+            if rss is not None and rss > EXTRACTION_WORKER_MAX_RSS_MB:
+                self.recycle("memory_limit")
+        return message[1]
+
+
+class WorkerPool:
+    """Fixed-size pool of extraction workers, started on first use."""
+    
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._workers:
+                return
+            # Forking a process that already runs scheduler, compactor and server
+            # threads can copy held locks into the child; spawn starts it clean
+            ctx = multiprocessing.get_context("spawn")
+            for _ in range(self.size):
+                worker = ExtractionWorker(ctx)
+                self._workers.append(worker)
+                self._idle.put(worker)
+            print(f"[INFO] Started {self.size} extraction workers")
+    
+    def run(self, pdf_path: str, budget: dict, on_stage=None, template_lookup=None) -> dict:
+        self._ensure_started()
+        worker = self._idle.get()
+        try:
+            return worker.run(pdf_path, budget, on_stage, template_lookup)
+        finally:
+            self._idle.put(worker)
+    
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+
+
+worker_pool = WorkerPool(EXTRACTION_WORKERS)
+
+
+def run_extraction(pdf_path: str, budget: Optional[dict] = None, on_stage=None, template_lookup=None) -> dict:
+    """Extract a contract within its budget, in a worker process when workers are enabled.
+
+    `on_stage(stage, payload)` and `template_lookup(signature)` are called in this process.
+    """
+    budget = default_budget() if budget is None else budget
+    if EXTRACTION_WORKERS <= 0:
+        from app.extractor import process_contract
+        return process_contract(
+            pdf_path,
+            budget=budget,
+            on_stage=lambda stage, payload: _notify(on_stage, stage, payload),
+            template_lookup=(lambda signature: _call(template_lookup, signature)) if template_lookup else None
+        )
+    return worker_pool.run(pdf_path, budget, on_stage, template_lookup)
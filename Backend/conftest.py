@@ -0,0 +1,126 @@
+# conftest.py
+"""
+Shared pytest setup for the backend tests.
+
+Tests run against an in-memory MongoDB (mongomock), in-process extraction and a
+temporary upload directory, so no server or database is needed:
+
+    pip install -r requirements.txt -r requirements-dev.txt
+    python -m pytest -q
+
+test_api.py and test_quick.py are manual scripts for a running server and are
+not collected.
+"""
+import os
+import tempfile
+import time
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="contract-uploads-"))
+os.environ.setdefault("EXTRACTION_WORKERS", "0")
+os.environ.setdefault("RETENTION_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RETRY_BASE_DELAY_SECONDS", "0.05")
+# Status polling in these tests would trip the limits; test_ratelimit.py enables them itself
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import mongomock
+import pymongo
+import pytest
+
+pymongo.MongoClient = mongomock.MongoClient
+
+import spacy
+
+try:
+    spacy.load("en_core_web_sm")
+except OSError:
+    # Without the trained model NER finds nothing, which the tests tolerate
+    _blank_nlp = spacy.blank("en")
+    spacy.load = lambda name, *args, **kwargs: _blank_nlp
+
+collect_ignore = ["test_api.py", "test_quick.py"]
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: list, padding: int = 0) -> bytes:
+    """Build a minimal text PDF, one string (lines separated by newlines) per page.
+
+    `padding` bytes of comment after the header stand in for a large file.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        commands = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        for line in text.split("\n"):
+            commands.append(f"({_pdf_escape(line)}) Tj T*")
+        commands.append("ET")
+        stream = "\n".join(commands)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {len(objects)} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"
+
+    out = b"%PDF-1.4\n"
+    if padding:
+        out += b"%" + b"x" * padding + b"\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+SAMPLE_CONTRACT = """MASTER SERVICES AGREEMENT
+This Agreement is between Acme Corp and Beta LLC. Registration No: 12-345.
+1. PAYMENT TERMS
+Total fees $1,200.00 payable monthly. Net 30. Payment due within 30 days.
+Account Number: AC-100 Email: billing@acme.com"""
+
+
+@pytest.fixture(scope="session")
+def api_app():
+    from app.main import app as fastapi_app
+    yield fastapi_app
+    from app.main import stop_extraction_workers
+    stop_extraction_workers()
+
+
+@pytest.fixture
+def client(api_app):
+    from fastapi.testclient import TestClient
+    return TestClient(api_app)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Every test starts with empty collections and caches."""
+    from app.db import db
+    from app.cache import detail_cache
+    for name in db.list_collection_names():
+        db[name].delete_many({})
+    detail_cache.clear()
+    yield
+
+
+def upload(client, text: str = SAMPLE_CONTRACT, pages: int = 1, filename: str = "contract.pdf", **kwargs) -> str:
+    pdf = make_pdf([text] * pages)
+    response = client.post("/contracts/upload", files={"file": (filename, pdf, "application/pdf")}, **kwargs)
+    assert response.status_code == 200, response.text
+    return response.json()["contract_id"]
+
+
+def wait_for(client, contract_id: str, statuses=("completed", "failed"), timeout: float = 30) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/contracts/{contract_id}/status").json()
+        if status.get("status") in statuses or time.monotonic() > deadline:
+            return status
+        time.sleep(0.05)
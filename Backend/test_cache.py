@@ -0,0 +1,57 @@
+"""Conditional GET and the in-process contract detail cache."""
+import time
+from app.cache import ResponseCache
+from app.db import contracts_collection
+from app.background import process_contract
+from conftest import upload, wait_for
+
+
+def test_lru_eviction_ttl_and_invalidation():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set(("a", "summary"), 1)
+    cache.set(("a", "raw"), 2)
+    cache.get(("a", "summary"))
+    cache.set(("b", "summary"), 3)
+    assert cache.get(("a", "raw")) is None
+    assert cache.stats()["evictions"] == 1
+
+    cache.invalidate("a")
+    assert cache.get(("a", "summary")) is None
+    assert cache.get(("b", "summary")) == 3
+
+    expiring = ResponseCache(max_entries=2, ttl_seconds=0)
+    expiring.set(("a", "summary"), 1)
+    time.sleep(0.01)
+    assert expiring.get(("a", "summary")) is None
+
+
+def test_conditional_get_and_cached_details(client):
+    contract_id = upload(client)
+    wait_for(client, contract_id)
+
+    first = client.get(f"/contracts/{contract_id}")
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+    assert client.get(f"/contracts/{contract_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    hits = client.get("/cache/stats").json()["hits"]
+    second = client.get(f"/contracts/{contract_id}")
+    assert second.content == first.content
+    assert client.get("/cache/stats").json()["hits"] == hits + 1
+
+    # Variants are cached separately and have their own validators
+    raw = client.get(f"/contracts/{contract_id}", params={"include_raw": True})
+    assert raw.headers["etag"] != etag
+
+
+def test_reprocessing_invalidates_the_cache(client):
+    contract_id = upload(client)
+    wait_for(client, contract_id)
+    etag = client.get(f"/contracts/{contract_id}").headers["etag"]
+
+    doc = contracts_collection.find_one({"contract_id": contract_id})
+    time.sleep(0.01)
+    process_contract(contract_id, doc["file_path"], doc["storage_key"])
+    response = client.get(f"/contracts/{contract_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
@@ -0,0 +1,65 @@
+"""Range and conditional downloads, and the storage backends behind them."""
+import pytest
+from app.downloads import parse_range, RangeNotSatisfiable
+from app.storage import LocalStorage, S3Storage, LocalS3Client, content_hash, shard_key
+from conftest import upload, make_pdf, SAMPLE_CONTRACT
+
+PDF = make_pdf([SAMPLE_CONTRACT])
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_full_and_partial_download(client):
+    contract_id = upload(client)
+    full = client.get(f"/contracts/{contract_id}/download")
+    assert full.status_code == 200
+    assert full.content == PDF
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["etag"] == f'"{content_hash(PDF)}"'
+    assert full.headers["content-disposition"] == 'attachment; filename="contract.pdf"'
+
+    partial = client.get(f"/contracts/{contract_id}/download", headers={"Range": "bytes=0-7"})
+    assert partial.status_code == 206
+    assert partial.content == PDF[:8]
+    assert partial.headers["content-range"] == f"bytes 0-7/{len(PDF)}"
+
+    unsatisfiable = client.get(f"/contracts/{contract_id}/download", headers={"Range": f"bytes={len(PDF)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(PDF)}"
+
+
+def test_conditional_download(client):
+    contract_id = upload(client)
+    etag = client.head(f"/contracts/{contract_id}/download").headers["etag"]
+    assert client.get(f"/contracts/{contract_id}/download", headers={"If-None-Match": etag}).status_code == 304
+    # A stale If-Range gets the whole file instead of the range
+    stale = client.get(f"/contracts/{contract_id}/download", headers={"Range": "bytes=0-7", "If-Range": '"old"'})
+    assert stale.status_code == 200 and stale.content == PDF
+
+
+@pytest.mark.parametrize("make_backend", [
+    lambda root: LocalStorage(str(root)),
+    lambda root: S3Storage(LocalS3Client(str(root)), "contracts", prefix="uploads"),
+])
+def test_storage_backends(tmp_path, make_backend):
+    backend = make_backend(tmp_path)
+    key = shard_key(content_hash(PDF), "c1.pdf")
+    assert key.count("/") == 2
+    backend.save(key, PDF)
+    assert backend.exists(key) and backend.size(key) == len(PDF)
+    assert b"".join(backend.iter_range(key, 5, 14, chunk_size=4)) == PDF[5:15]
+    assert backend.read(key) == PDF
+    with backend.local_copy(key) as path:
+        assert open(path, "rb").read() == PDF
+    backend.delete(key)
+    assert not backend.exists(key)
@@ -0,0 +1,58 @@
+"""Bulk export in CSV, JSONL and Parquet."""
+import csv
+import io
+import os
+import threading
+import orjson
+import pyarrow.parquet as pq
+from app import main
+from conftest import upload, wait_for
+
+
+def completed_contract(client) -> str:
+    contract_id = upload(client)
+    assert wait_for(client, contract_id)["status"] == "completed"
+    return contract_id
+
+
+def test_csv_export(client):
+    contract_id = completed_contract(client)
+    response = client.get("/contracts/export", params={"format": "csv", "columns": "contract_id,financial_amounts"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].startswith("attachment")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert rows == [{"contract_id": contract_id, "financial_amounts": "$1,200.00"}]
+
+
+def test_jsonl_export(client):
+    contract_id = completed_contract(client)
+    response = client.get("/contracts/export", params={"format": "jsonl", "status": "completed"})
+    rows = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [row["contract_id"] for row in rows] == [contract_id]
+    assert rows[0]["financial_amounts"] == ["$1,200.00"]
+
+
+def test_parquet_export(client, monkeypatch):
+    contract_id = completed_contract(client)
+    written = []
+    export_contracts = main.export_contracts
+
+    def record(collection, fmt, output, *args):
+        written.append((output, threading.current_thread()))
+        return export_contracts(collection, fmt, output, *args)
+
+    monkeypatch.setattr(main, "export_contracts", record)
+    response = client.get("/contracts/export", params={"format": "parquet"})
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("contract_id").to_pylist() == [contract_id]
+    assert table.column("financial_amounts").to_pylist() == [["$1,200.00"]]
+    # Written off the event loop thread and removed once the response was sent
+    [(tmp_path, thread)] = written
+    assert thread.name.startswith("AnyIO worker thread")
+    assert not os.path.exists(tmp_path)
+
+
+def test_invalid_export_requests(client):
+    assert client.get("/contracts/export", params={"format": "xml"}).status_code == 400
+    assert client.get("/contracts/export", params={"columns": "nope"}).status_code == 400
@@ -0,0 +1,64 @@
+"""Sparse fieldsets, JSON serialization and response compression."""
+from datetime import datetime
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from app.compression import CompressionMiddleware
+from app.queries import parse_fields, build_projection
+from app.responses import dumps
+from conftest import upload, wait_for
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields("status, score,status") == ["status", "score"]
+    # An ancestor covers its descendants
+    assert parse_fields("financial_details.amounts,financial_details") == ["financial_details"]
+    with pytest.raises(HTTPException):
+        parse_fields("password")
+
+
+def test_build_projection():
+    assert build_projection(None) == {"_id": 0}
+    assert build_projection(["score"]) == {"_id": 0, "contract_id": 1, "score": 1}
+    assert build_projection(["raw_extracted_data"], always=("raw_extracted_data.full_text",)) == {"_id": 0, "raw_extracted_data": 1}
+
+
+def test_dumps_handles_bson_and_datetimes():
+    oid = ObjectId()
+    assert orjson.loads(dumps({"_id": oid, "at": datetime(2024, 1, 2, 3, 4, 5), 1: "x"})) == {
+        "_id": str(oid), "at": "2024-01-02T03:04:05", "1": "x"
+    }
+
+
+def test_sparse_fieldsets(client):
+    contract_id = upload(client)
+    wait_for(client, contract_id)
+
+    detail = client.get(f"/contracts/{contract_id}", params={"fields": "score,financial_details.amounts"}).json()
+    assert set(detail) == {"contract_id", "status", "score", "financial_details"}
+    assert detail["financial_details"] == {"amounts": ["$1,200.00"]}
+
+    listed = client.get("/contracts", params={"fields": "status"}).json()["contracts"]
+    assert listed == [{"contract_id": contract_id, "status": "completed"}]
+    assert client.get("/contracts", params={"fields": "nope"}).status_code == 400
+
+
+def test_compression(client):
+    contract_id = upload(client)
+    wait_for(client, contract_id)
+    large = client.get(f"/contracts/{contract_id}", params={"include_raw": True}, headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert "vary" in large.headers and "Accept-Encoding" in large.headers["vary"]
+    assert large.json()["contract_id"] == contract_id
+
+    small = client.get(f"/contracts/{contract_id}/status", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert client.get(f"/contracts/{contract_id}", headers={"Accept-Encoding": "identity"}).headers.get("content-encoding") is None
+
+
+def test_choose_encoding():
+    middleware = CompressionMiddleware(None)
+    assert middleware.choose_encoding("gzip;q=0, deflate") is None
+    assert middleware.choose_encoding("br;q=0.5, gzip") in ("br", "gzip")
@@ -0,0 +1,88 @@
+"""Rate limiting middleware, client identity and upload admission control."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import clients
+from app.ratelimit import (
+    RateLimit,
+    RateLimiter,
+    RateLimitMiddleware,
+    MemoryRateLimitStore,
+    MongoRateLimitStore,
+    UploadAdmission,
+    route_class,
+    refill,
+)
+from app.db import rate_limits_collection
+
+
+def limited_client(limits: dict, admission=None) -> TestClient:
+    inner = FastAPI()
+
+    @inner.get("/contracts/{contract_id}/status")
+    def status(contract_id: str):
+        return {"contract_id": contract_id}
+
+    @inner.post("/contracts/upload")
+    def upload():
+        return {"ok": True}
+
+    limiter = RateLimiter(MemoryRateLimitStore(), limits, admission)
+    return TestClient(RateLimitMiddleware(inner, limiter))
+
+
+def test_route_classes():
+    assert route_class("POST", "/contracts/upload") == "upload"
+    assert route_class("GET", "/contracts/abc/status") == "status"
+    assert route_class("GET", "/contracts/abc/download") == "download"
+    assert route_class("GET", "/contracts") == "default"
+
+
+def test_refill():
+    limit = RateLimit(60, 2)
+    assert refill(0, 0.5, limit, 1) == (False, 0.5, 0.5)
+    assert refill(0, 10, limit, 1) == (True, 1.0, 0.0)
+
+
+def test_status_polling_is_limited_with_retry_after():
+    client = limited_client({"status": RateLimit(60, 2), "default": RateLimit(600, 100)})
+    assert client.get("/contracts/a/status").headers["X-RateLimit-Remaining"] == "1"
+    assert client.get("/contracts/a/status").status_code == 200
+    response = client.get("/contracts/a/status")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_rotating_client_headers_does_not_reset_the_bucket():
+    client = limited_client({"status": RateLimit(60, 2), "default": RateLimit(600, 100)})
+    codes = [
+        client.get("/contracts/a/status", headers={"X-Client-Id": f"c{i}", "X-Api-Key": f"k{i}"}).status_code
+        for i in range(4)
+    ]
+    assert codes == [200, 200, 429, 429]
+
+
+def test_configured_api_keys_get_their_own_bucket(monkeypatch):
+    monkeypatch.setattr(clients, "_KNOWN_KEYS", {clients._key_hash("secret")})
+    client = limited_client({"status": RateLimit(60, 1), "default": RateLimit(600, 100)})
+    assert client.get("/contracts/a/status").status_code == 200
+    assert client.get("/contracts/a/status").status_code == 429
+    assert client.get("/contracts/a/status", headers={"X-Api-Key": "secret"}).status_code == 200
+
+
+def test_upload_admission_sheds_load_before_reading_body():
+    admission = UploadAdmission(max_concurrent=1, max_per_client=1, max_bytes=1024)
+    admission.acquire("ip:other", 10)
+    client = limited_client({"upload": RateLimit(600, 100), "default": RateLimit(600, 100)}, admission)
+    response = client.post("/contracts/upload", content=b"x" * 10)
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    admission.release("ip:other", 10)
+    assert client.post("/contracts/upload", content=b"x" * 10).status_code == 200
+    assert admission.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("store", [MemoryRateLimitStore(max_buckets=2), MongoRateLimitStore(rate_limits_collection)])
+def test_stores_share_the_token_bucket(store):
+    limit = RateLimit(60, 2)
+    assert [store.take("k", limit)[0] for _ in range(3)] == [True, True, False]
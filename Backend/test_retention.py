@@ -0,0 +1,102 @@
+"""Archive tier: compaction, read-through of archived text and PDF restore."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.db import contracts_collection
+from app.retention import RetentionCompactor, parse_retention_policy, restore_pdf
+from app.storage import LocalStorage, LocalS3Client, storage_for
+from conftest import upload, wait_for, make_pdf, SAMPLE_CONTRACT
+
+
+def archive_everything(contract_id: str) -> dict:
+    contracts_collection.update_one({"contract_id": contract_id}, {"$set": {"updated_at": datetime.utcnow() - timedelta(days=1)}})
+    compactor = RetentionCompactor({"completed": 0.5}, {"completed": 0.5}, max_bytes_per_second=0)
+    return compactor.run_once()
+
+
+def test_parse_retention_policy():
+    assert parse_retention_policy("completed=90, failed=30, pending=1, bad") == {"completed": 90.0, "failed": 30.0}
+
+
+def test_archived_text_is_read_through(client):
+    contract_id = upload(client)
+    wait_for(client, contract_id)
+    report = archive_everything(contract_id)
+    assert report["text_archived"] == 1 and report["pdfs_archived"] == 1
+    doc = contracts_collection.find_one({"contract_id": contract_id})
+    assert "full_text" not in doc["raw_extracted_data"]
+
+    detail = client.get(f"/contracts/{contract_id}", params={"include_raw": True}).json()
+    assert "Acme Corp" in detail["raw_extracted_data"]["full_text"]
+    assert "Acme Corp" in client.get(f"/contracts/{contract_id}/raw").json()["raw_extracted_data"]["full_text"]
+
+    listed = client.get("/contracts").json()["contracts"]
+    assert "full_text" not in listed[0]["raw_extracted_data"]
+    assert listed[0]["archive"]["text_key"]
+    listed = client.get("/contracts", params={"fields": "raw_extracted_data.full_text"}).json()["contracts"]
+    assert "Acme Corp" in listed[0]["raw_extracted_data"]["full_text"]
+    assert "archive" not in listed[0]
+    listed = client.get("/contracts", params={"fields": "status,raw_text"}).json()["contracts"]
+    assert "Acme Corp" in listed[0]["raw_text"]
+    assert set(listed[0]) == {"contract_id", "status", "raw_text"}
+
+
+def test_archived_pdf_is_restored_on_download(client):
+    contract_id = upload(client)
+    wait_for(client, contract_id)
+    archive_everything(contract_id)
+    doc = contracts_collection.find_one({"contract_id": contract_id})
+    assert doc["archive"]["pdf_key"]
+
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: client.get(f"/contracts/{contract_id}/download"), range(4)))
+    assert [r.status_code for r in responses] == [200] * 4
+    assert all(r.content == make_pdf([SAMPLE_CONTRACT]) for r in responses)
+    doc = contracts_collection.find_one({"contract_id": contract_id})
+    assert "pdf_key" not in doc["archive"]
+    assert doc["archive"]["pdf_restored_at"]
+
+
+def test_restore_is_idempotent_for_racing_requests(client):
+    contract_id = upload(client)
+    wait_for(client, contract_id)
+    archive_everything(contract_id)
+    # Both requests read the document before either restored the file
+    stale = contracts_collection.find_one({"contract_id": contract_id}, {"_id": 0})
+    backend, key = restore_pdf(contract_id, stale)
+    assert restore_pdf(contract_id, stale) == (backend, key)
+    assert backend.read(key) == make_pdf([SAMPLE_CONTRACT])
+
+
+def test_skipped_documents_do_not_block_later_batches(client):
+    missing, restored, archivable = (upload(client, filename=f"c{i}.pdf") for i in range(3))
+    for age, contract_id in enumerate((archivable, restored, missing), start=1):
+        wait_for(client, contract_id)
+        contracts_collection.update_one({"contract_id": contract_id}, {"$set": {"updated_at": datetime.utcnow() - timedelta(days=age)}})
+    backend, key = storage_for(contracts_collection.find_one({"contract_id": missing}))
+    backend.delete(key)
+    contracts_collection.update_one({"contract_id": restored}, {"$set": {"archive.pdf_restored_at": datetime.utcnow()}})
+    contracts_collection.update_one({"contract_id": missing}, {"$set": {"raw_text": "edited by hand"}})
+
+    compactor = RetentionCompactor({}, {"completed": 0.5}, batch_size=1, max_bytes_per_second=0)
+    reports = [compactor.run_once() for _ in range(3)]
+    assert [r["pdfs_skipped"] for r in reports] == [1, 0, 0]
+    assert [r["pdfs_archived"] for r in reports] == [0, 1, 0]
+    docs = {d["contract_id"]: d.get("archive", {}) for d in contracts_collection.find()}
+    assert docs[missing]["pdf_skipped_reason"] == "file_missing"
+    assert docs[missing]["raw_text_differs"] is True
+    assert "pdf_key" not in docs[restored]
+    assert docs[archivable]["pdf_key"]
+
+
+def test_concurrent_saves_use_separate_temp_files(tmp_path):
+    backends = [
+        (LocalStorage(str(tmp_path / "local")), lambda b, k, d: b.save(k, d), tmp_path / "local"),
+        (LocalS3Client(str(tmp_path / "s3")), lambda b, k, d: b.put_object(Bucket="bucket", Key=k, Body=d), tmp_path / "s3" / "bucket"),
+    ]
+    for backend, save, root in backends:
+        payloads = [bytes([i]) * 200_000 for i in range(8)]
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda data: save(backend, "ab/cd/file.pdf", data), payloads))
+        assert os.listdir(root / "ab" / "cd") == ["file.pdf"]
+        assert (root / "ab" / "cd" / "file.pdf").read_bytes() in payloads
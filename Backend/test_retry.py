@@ -0,0 +1,121 @@
+"""Retry policy, failure classification and dead letters."""
+import time
+from datetime import datetime, timedelta
+from pymongo import errors as mongo_errors
+from app import background
+from app.retry import RetryPolicy, ExtractionFailed, classify_exception, TRANSIENT, PERMANENT
+from app.worker import partial_result
+from app.main import build_contract_details
+from app.db import contracts_collection
+from conftest import upload, wait_for
+
+
+def test_classify_exception():
+    assert classify_exception(ConnectionError()) == TRANSIENT
+    assert classify_exception(mongo_errors.AutoReconnect()) == TRANSIENT
+    assert classify_exception(ExtractionFailed("boom", "worker_crashed")) == TRANSIENT
+    assert classify_exception(ExtractionFailed("bad pdf", "PDFSyntaxError")) == PERMANENT
+    assert classify_exception(ValueError()) == PERMANENT
+
+
+def test_backoff_uses_equal_jitter_and_gives_up():
+    policy = RetryPolicy(max_attempts=3, base_delay=1, max_delay=3)
+    for attempt, ceiling in [(1, 1), (2, 2), (3, 3)]:
+        assert ceiling / 2 <= policy.backoff(attempt) <= ceiling
+    assert policy.next_delay(TRANSIENT, 2) is not None
+    assert policy.next_delay(TRANSIENT, 3) is None
+    assert policy.next_delay(PERMANENT, 1) is None
+
+
+def test_worker_crash_fails_instead_of_completing():
+    stages = {"text": {"text": "Total $5.00", "text_stats": {}, "truncation": []}}
+    result = partial_result("/tmp/x.pdf", stages, "worker_crashed")
+    assert result["processing_status"] == "failed"
+    assert result["error_type"] == "worker_crashed"
+    assert partial_result("/tmp/x.pdf", stages, "document_timeout")["truncated"] is True
+
+
+def test_transient_failure_is_retried(client, monkeypatch):
+    real_run_extraction = background.run_extraction
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("storage unavailable")
+        return real_run_extraction(*args, **kwargs)
+
+    monkeypatch.setattr(background, "run_extraction", flaky)
+    contract_id = upload(client)
+    status = wait_for(client, contract_id)
+    assert status["status"] == "completed"
+    assert len(calls) == 2
+    assert client.get("/dead-letters").json()["summary"]["total"] == 0
+
+
+def test_permanent_failure_is_dead_lettered_and_requeued(client, monkeypatch):
+    real_run_extraction = background.run_extraction
+
+    def broken(*args, **kwargs):
+        raise ValueError("unreadable")
+
+    monkeypatch.setattr(background, "run_extraction", broken)
+    contract_id = upload(client)
+    assert wait_for(client, contract_id)["status"] == "failed"
+
+    detail = client.get(f"/contracts/{contract_id}").json()
+    assert detail["failure_kind"] == "permanent"
+    assert detail["attempts"] == 1
+    entry = client.get(f"/dead-letters/{contract_id}").json()
+    assert entry["error_type"] == "ValueError"
+    assert client.get("/dead-letters", params={"failure_kind": "permanent"}).json()["summary"]["by_error_type"] == {"ValueError": 1}
+
+    monkeypatch.setattr(background, "run_extraction", real_run_extraction)
+    response = client.post("/dead-letters/requeue", params={"error_type": "ValueError"}).json()
+    assert response["requeued"] == [contract_id]
+    assert wait_for(client, contract_id)["status"] == "completed"
+    assert client.get(f"/dead-letters/{contract_id}").status_code == 404
+
+
+def test_retrying_contract_details():
+    next_retry_at = datetime(2030, 1, 1)
+    doc = {
+        "status": "retrying",
+        "error": "storage unavailable",
+        "failure_kind": "transient",
+        "attempts": 2,
+        "next_retry_at": next_retry_at,
+    }
+    details = build_contract_details("c1", doc)
+    assert details["status"] == "retrying"
+    assert details["error"] == "storage unavailable"
+    assert details["attempts"] == 2
+    assert details["next_retry_at"] == next_retry_at
+
+
+def test_startup_resumes_pending_and_retrying_contracts(client):
+    pending_id, retrying_id = upload(client), upload(client)
+    wait_for(client, pending_id)
+    wait_for(client, retrying_id)
+    # As left behind by a restart: the queue and the backoff heap were lost
+    contracts_collection.update_one({"contract_id": pending_id}, {"$set": {"status": "pending", "attempts": 0}})
+    contracts_collection.update_one({"contract_id": retrying_id}, {"$set": {
+        "status": "retrying", "attempts": 1, "next_retry_at": datetime.utcnow() + timedelta(seconds=0.5)
+    }})
+
+    assert background.resume_unfinished_jobs() == {"pending": 1, "retrying": 1}
+    assert wait_for(client, pending_id)["status"] == "completed"
+    time.sleep(0.2)
+    assert client.get(f"/contracts/{retrying_id}/status").json()["status"] == "retrying"
+    assert wait_for(client, retrying_id)["status"] == "completed"
+    assert contracts_collection.find_one({"contract_id": retrying_id})["attempts"] == 2
+
+
+def test_unrecorded_permanent_failure_is_not_retried(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise mongo_errors.AutoReconnect("primary stepped down")
+
+    monkeypatch.setattr(background.contracts_collection, "update_one", unavailable)
+    assert background.record_failure("c1", ValueError("unreadable"), 1) is None
+    assert background.record_failure("c1", ConnectionError("blip"), background.extraction_retry_policy.max_attempts) is None
+    assert background.record_failure("c1", ConnectionError("blip"), 1) is not None
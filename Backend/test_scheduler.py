@@ -0,0 +1,103 @@
+"""Extraction scheduler: fair share between clients without idling free slots."""
+import re
+import threading
+import time
+from app.scheduler import ExtractionScheduler, ExtractionJob, estimate_cost
+from app.utils import pdf_page_count_hint
+from conftest import make_pdf
+
+
+def job(contract_id, client_id="a", cost=1.0, priority="normal"):
+    return ExtractionJob(contract_id, f"/tmp/{contract_id}.pdf", None, client_id, priority, cost)
+
+
+def queue(scheduler, *jobs):
+    with scheduler._cond:
+        for j in jobs:
+            scheduler._enqueue(j)
+
+
+def select(scheduler):
+    with scheduler._cond:
+        selected = scheduler._select()
+        return selected.contract_id if selected else None
+
+
+def test_estimate_cost_reads_page_count():
+    assert estimate_cost(make_pdf(["one", "two", "three"]))["estimated_pages"] == 3
+    assert estimate_cost(b"not a pdf" * 10000)["estimated_pages"] is None
+
+
+def test_page_count_seeks_through_the_xref_table():
+    data = make_pdf(["page"] * 7, padding=45 * 1024 * 1024)
+    started = time.perf_counter()
+    assert pdf_page_count_hint(data) == 7
+    assert time.perf_counter() - started < 0.05
+
+
+def test_page_count_follows_incremental_updates():
+    data = make_pdf(["one", "two"])
+    old_xref = int(re.search(rb"startxref\n(\d+)", data).group(1))
+    # An update rewriting the page tree (object 2) with a new count
+    update_offset = len(data)
+    data += b"2 0 obj\n<< /Type /Pages /Kids [4 0 R 6 0 R 4 0 R] /Count 3 >>\nendobj\n"
+    xref = len(data)
+    data += f"xref\n2 1\n{update_offset:010d} 00000 n \ntrailer\n<< /Size 7 /Root 1 0 R /Prev {old_xref} >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    assert pdf_page_count_hint(data) == 3
+
+
+def test_page_count_scan_is_bounded_without_an_xref_table():
+    small = make_pdf(["one", "two"]).replace(b"startxref", b"startxrex")
+    assert pdf_page_count_hint(small) == 2
+    large = make_pdf(["one", "two"], padding=5 * 1024 * 1024).replace(b"startxref", b"startxrex")
+    assert pdf_page_count_hint(large) == 2
+    # Objects outside the scanned head and tail are not found, and page objects are not counted
+    buried = small + b"%" + b"x" * 5 * 1024 * 1024 + b"\n"
+    assert pdf_page_count_hint(buried) is None
+
+
+def test_single_client_uses_every_slot():
+    scheduler = ExtractionScheduler(lambda j: time.sleep(0.2), concurrency=4, max_running_per_client=3)
+    started = time.monotonic()
+    for i in range(4):
+        scheduler.submit(job(f"c{i}"))
+    while scheduler.completed < 4 and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - started
+    scheduler.shutdown()
+    assert scheduler.completed == 4
+    assert elapsed < 0.35
+
+
+def test_cap_applies_while_other_clients_wait():
+    scheduler = ExtractionScheduler(lambda j: None, concurrency=3, max_running_per_client=1)
+    queue(scheduler, job("a1"), job("a2"), job("a3"))
+    assert select(scheduler) == "a1"
+    # Nobody else is waiting, so client a may exceed its cap
+    assert select(scheduler) == "a2"
+
+    queue(scheduler, job("b1", client_id="b"))
+    assert select(scheduler) == "b1"
+
+
+def test_cheaper_and_higher_priority_jobs_first():
+    scheduler = ExtractionScheduler(lambda j: None, concurrency=3, max_running_per_client=3)
+    queue(scheduler, job("big", cost=20), job("small", cost=1), job("bulk", cost=0.5, priority="bulk"))
+    assert [select(scheduler) for _ in range(3)] == ["small", "big", "bulk"]
+
+
+def test_fair_share_by_usage_and_weight():
+    scheduler = ExtractionScheduler(lambda j: None, concurrency=4, max_running_per_client=4, weights={"b": 4})
+    queue(scheduler, *(job(f"a{i}", cost=4) for i in range(3)), *(job(f"b{i}", client_id="b", cost=4) for i in range(3)))
+    order = [select(scheduler) for _ in range(4)]
+    # b's weight of 4 makes each of its jobs count for a quarter of a's
+    assert order.count("a0") == 1 and sum(c.startswith("b") for c in order) == 3
+
+
+def test_delayed_job_waits_out_its_backoff():
+    ran = threading.Event()
+    scheduler = ExtractionScheduler(lambda j: ran.set(), concurrency=1)
+    scheduler.submit(job("retry"), delay=0.2)
+    assert not ran.wait(0.1)
+    assert ran.wait(2)
+    scheduler.shutdown()
@@ -0,0 +1,67 @@
+"""Section segmentation, classification and rule routing."""
+from app.segmentation import segment_text, classify_section, build_routes, page_for_offset, _is_boundary
+from conftest import upload, wait_for
+
+CONTRACT = """This Agreement is made between Acme Corp and Beta LLC.
+1. PAYMENT TERMS
+Fees of $1,200.00 are payable monthly, and late invoices accrue interest of 1% per month
+30 days after notice, unpaid fees may be referred to collection.
+2. Term and Termination
+This Agreement runs for 12 months.
+3.1 Service Levels
+Uptime of 99.9% is guaranteed.
+SIGNATURES
+IN WITNESS WHEREOF the parties have signed below.
+"""
+
+
+def test_headings_and_wrapped_lines():
+    assert _is_boundary("1. PAYMENT TERMS")
+    assert _is_boundary("3.2 Fees")
+    assert _is_boundary("IV. Term")
+    assert _is_boundary("Section 4")
+    assert _is_boundary("ARTICLE II - DEFINITIONS")
+    assert _is_boundary("3. Term of this agreement.")
+    assert not _is_boundary("30 days after notice, unpaid fees may be referred to collection.")
+    assert not _is_boundary("12 months from the Effective Date and")
+    assert not _is_boundary("Section 4 of this Agreement shall survive termination")
+
+
+def test_segment_text():
+    index = segment_text(CONTRACT, [0, 200])
+    kinds = [(section["kind"], section["heading"]) for section in index["sections"]]
+    assert kinds == [
+        ("preamble", ""),
+        ("payment", "1. PAYMENT TERMS"),
+        ("term", "2. Term and Termination"),
+        ("sla", "3.1 Service Levels"),
+        ("signatures", "SIGNATURES"),
+    ]
+    assert [section["page"] for section in index["sections"]] == [1, 1, 2, 2, 2]
+    assert index["sections"][-1]["end"] == len(CONTRACT)
+    assert page_for_offset([0, 100], 150) == 2
+
+
+def test_keywords_match_whole_words():
+    assert classify_section("Legislation", "") == "general"
+    assert classify_section("How we determine prices", "") == "payment"
+    assert classify_section("Third-party software", "") == "general"
+    assert classify_section("Invoices", "") == "payment"
+    assert classify_section("Other", "Total of $500") == "financial"
+
+
+def test_build_routes():
+    index = segment_text(CONTRACT)
+    routes = build_routes(index)
+    payment = next(s for s in index["sections"] if s["kind"] == "payment")
+    assert routes["payment_terms"] == [[payment["start"], payment["end"]]]
+    assert "parties" in routes
+
+
+def test_sections_endpoint(client):
+    contract_id = upload(client, CONTRACT)
+    wait_for(client, contract_id)
+    response = client.get(f"/contracts/{contract_id}/sections").json()
+    assert [s["kind"] for s in response["sections"]][:2] == ["preamble", "payment"]
+    detail = client.get(f"/contracts/{contract_id}").json()
+    assert "$1,200.00" in detail["financial_details"]["amounts"]
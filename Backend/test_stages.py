@@ -0,0 +1,36 @@
+"""Partial results published per extraction stage while a contract is processing."""
+import threading
+from app import background
+from conftest import upload, wait_for
+
+
+def test_stages_are_visible_while_processing(client, monkeypatch):
+    real_run_extraction = background.run_extraction
+    fields_published, release = threading.Event(), threading.Event()
+
+    def paused_after_fields(path, on_stage=None, **kwargs):
+        def on_stage_then_wait(stage, payload):
+            on_stage(stage, payload)
+            if stage == "fields":
+                fields_published.set()
+                release.wait(10)
+        return real_run_extraction(path, on_stage=on_stage_then_wait, **kwargs)
+
+    monkeypatch.setattr(background, "run_extraction", paused_after_fields)
+    contract_id = upload(client)
+    try:
+        assert fields_published.wait(10)
+        status = client.get(f"/contracts/{contract_id}/status").json()
+        assert status["status"] == "processing"
+        assert status["sections_ready"] == {"text": True, "fields": True, "entities": False, "score": False}
+        assert status["progress_percentage"] == 50
+
+        detail = client.get(f"/contracts/{contract_id}").json()
+        assert detail["status"] == "processing"
+        assert detail["raw_extracted_data"]["text_length"] > 0
+        assert "$1,200.00" in detail["financial_details"]["amounts"]
+    finally:
+        release.set()
+
+    assert wait_for(client, contract_id)["status"] == "completed"
+    assert all(client.get(f"/contracts/{contract_id}/status").json()["sections_ready"].values())
@@ -0,0 +1,85 @@
+"""Template fingerprinting: matching, deviation reporting and reprocessing templates."""
+import random
+from conftest import upload, wait_for
+from app.db import contracts_collection, fingerprints_collection
+from app.templates import find_template
+from app.background import process_contract
+from app.extractor import extract_fields
+
+random.seed(7)
+_VOCAB = ["services", "party", "term", "notice", "law", "shall", "agreement", "liability",
+          "warranty", "indemnify", "hereby", "provider", "customer", "data", "fees", "schedule"]
+BOILERPLATE = "\n".join(" ".join(random.choice(_VOCAB) for _ in range(12)) for _ in range(60))
+
+TEMPLATE = """This Master Agreement is between {name} and Beta LLC.
+Account Number: AC-{number} Email: billing@example.com
+Total fees $1,{number}.00 payable monthly. Net 30.
+{extra}""" + BOILERPLATE
+
+
+def contract_text(name="Acme", number=100, extra=""):
+    return TEMPLATE.format(name=name, number=number, extra=extra)
+
+
+def test_near_duplicate_matches_template(client):
+    template_id = upload(client, contract_text())
+    assert wait_for(client, template_id)["status"] == "completed"
+    copy_id = upload(client, contract_text("Globex", 250))
+    assert wait_for(client, copy_id)["status"] == "completed"
+
+    detail = client.get(f"/contracts/{copy_id}").json()
+    assert detail["template_match"]["template_id"] == template_id
+    assert detail["template_match"]["missing_fields"] == []
+
+    similar = client.get(f"/contracts/{template_id}/similar").json()
+    assert similar["is_template"] is True
+    assert [d["contract_id"] for d in similar["near_duplicates"]] == [copy_id]
+
+
+def test_added_content_is_extracted_and_reported(client):
+    template_id = upload(client, contract_text())
+    wait_for(client, template_id)
+    variant_id = upload(client, contract_text(extra="Reference Number: REF-999\nAdditional setup fee $4,000.00"))
+    wait_for(client, variant_id)
+
+    detail = client.get(f"/contracts/{variant_id}").json()
+    assert "$4,000.00" in detail["financial_details"]["amounts"]
+    assert "REF-999" in detail["account_information"]["account_numbers"]
+    match = detail["template_match"]
+    assert match["template_id"] == template_id
+    assert match["suspicious"] is True
+    assert "amounts" in match["added_fields"] + match["extra_matches"]
+    assert "account_numbers" in match["added_fields"] + match["extra_matches"]
+
+
+def test_reprocessing_a_template_does_not_demote_it(client):
+    template_id = upload(client, contract_text())
+    wait_for(client, template_id)
+    before = fingerprints_collection.find_one({"contract_id": template_id})
+    assert before["is_template"]
+
+    doc = contracts_collection.find_one({"contract_id": template_id})
+    assert process_contract(template_id, doc["file_path"], doc["storage_key"]) is None
+
+    after = fingerprints_collection.find_one({"contract_id": template_id})
+    assert after["is_template"] is True
+    assert after["template_id"] == template_id
+    assert after["rule_locations"]
+    assert find_template(after["signature"])["template_id"] == template_id
+    # A reprocessed template never matches itself
+    assert find_template(after["signature"], exclude_contract_id=template_id) is None
+
+
+def test_plan_windows_skip_the_full_text_scan():
+    text = "Payment is due Net 30 from invoice.\n" + "filler line\n" * 200 + "Earlier drafts said Net 60.\n"
+    assert sorted(extract_fields(text)["payment_structure"]["terms"]) == ["Net 30", "Net 60"]
+
+    # A pattern that hits in its template window is not searched anywhere else
+    locations = {}
+    fields = extract_fields(text, plan={"payment_terms:0": [[0, 40]]}, locations=locations)
+    assert fields["payment_structure"]["terms"] == ["Net 30"]
+    assert locations["payment_terms:0"] == [[15, 21]]
+
+    # One that misses its window falls back to the full text
+    fields = extract_fields(text, plan={"payment_terms:0": [[100, 140]]})
+    assert sorted(fields["payment_structure"]["terms"]) == ["Net 30", "Net 60"]
@@ -0,0 +1,40 @@
+"""Extraction worker processes and their watchdog."""
+import threading
+from app.worker import WorkerPool, ExtractionWorker, default_budget, partial_result
+from conftest import make_pdf, SAMPLE_CONTRACT
+
+
+def test_budget_overrun_completes_as_truncated():
+    stages = {"text": {"text": "Total fees $1,200.00", "text_stats": {}, "truncation": []}}
+    result = partial_result("/tmp/x.pdf", stages, "document_timeout")
+    assert result["truncated"] is True
+    assert result["truncation_reasons"] == ["document_timeout"]
+    assert result["processing_status"] != "failed"
+
+
+def test_pool_spawns_workers():
+    pool = WorkerPool(1)
+    try:
+        pool._ensure_started()
+        worker = pool._workers[0]
+        assert worker._ctx.get_start_method() == "spawn"
+        assert worker.process.is_alive()
+    finally:
+        pool.shutdown()
+
+
+def test_crashed_worker_is_recycled_and_fails_transiently(tmp_path):
+    import multiprocessing
+    pdf_path = tmp_path / "contract.pdf"
+    pdf_path.write_bytes(make_pdf([SAMPLE_CONTRACT]))
+    worker = ExtractionWorker(multiprocessing.get_context("spawn"))
+    crashed_pid = worker.process.pid
+    try:
+        # The child is still importing the extractor when it is killed
+        threading.Timer(0.2, worker.process.kill).start()
+        result = worker.run(str(pdf_path), default_budget())
+        assert result["processing_status"] == "failed"
+        assert result["error_type"] == "worker_crashed"
+        assert worker.process.pid != crashed_pid and worker.process.is_alive()
+    finally:
+        worker.stop()